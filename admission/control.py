@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from metrics.pipeline import ADMISSION_IN_FLIGHT, ADMISSION_QUEUED, ADMISSION_REJECTIONS
+
+ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS: float = float(
+    os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"),
+)
+ADMISSION_RETRY_AFTER_SECONDS: float = float(
+    os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"),
+)
+API_KEY_RATE_LIMIT_PER_MINUTE: float = float(
+    os.getenv("API_KEY_RATE_LIMIT_PER_MINUTE", "120"),
+)
+API_KEY_RATE_LIMIT_BURST: int = int(os.getenv("API_KEY_RATE_LIMIT_BURST", "30"))
+API_KEY_RATE_LIMIT_MAX_KEYS: int = int(
+    os.getenv("API_KEY_RATE_LIMIT_MAX_KEYS", "4096"),
+)
+
+
+class AdmissionRejectedError(RuntimeError):
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ServiceSaturatedError(AdmissionRejectedError):
+    pass
+
+
+class RateLimitExceededError(AdmissionRejectedError):
+    pass
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+        retry_after: float = ADMISSION_RETRY_AFTER_SECONDS,
+    ) -> None:
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._retry_after = retry_after
+        self._active = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_concurrency > 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, reason: str) -> ServiceSaturatedError:
+        ADMISSION_REJECTIONS.labels(reason).inc()
+        logging.warning(
+            "Shedding calendar request (%s): %d running, %d queued",
+            reason,
+            self._active,
+            len(self._waiters),
+        )
+        return ServiceSaturatedError(
+            "Service is saturated, retry later",
+            self._retry_after,
+        )
+
+    async def acquire(self, queue: bool = True) -> None:
+        if not self.enabled:
+            return
+        if self._active < self._max_concurrency and not self._waiters:
+            self._active += 1
+            ADMISSION_IN_FLIGHT.inc()
+            return
+        if not queue:
+            raise self._reject("busy")
+        if len(self._waiters) >= self._max_queue:
+            raise self._reject("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.inc()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self._queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("queue_timeout") from None
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            ADMISSION_QUEUED.dec()
+
+    def release(self) -> None:
+        if not self.enabled:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+        ADMISSION_IN_FLIGHT.dec()
+
+    @asynccontextmanager
+    async def admit(self, queue: bool = True) -> AsyncIterator[None]:
+        await self.acquire(queue)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def take(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(
+            self._burst,
+            self._tokens + (now - self._updated) * self._rate,
+        )
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        per_minute: float = API_KEY_RATE_LIMIT_PER_MINUTE,
+        burst: int = API_KEY_RATE_LIMIT_BURST,
+        max_keys: int = API_KEY_RATE_LIMIT_MAX_KEYS,
+    ) -> None:
+        self._rate = per_minute / 60
+        self._burst = max(1, burst)
+        self._max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self._rate > 0
+
+    def check(self, key: str) -> None:
+        if not self.enabled:
+            return
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self._rate, self._burst)
+            while len(self._buckets) > self._max_keys:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        retry_after = bucket.take()
+        if retry_after > 0:
+            ADMISSION_REJECTIONS.labels("rate_limited").inc()
+            raise RateLimitExceededError("Rate limit exceeded", retry_after)
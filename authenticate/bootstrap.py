@@ -0,0 +1,70 @@
+import argparse
+import logging
+import sys
+
+from selenium import webdriver
+from selenium.webdriver.firefox.options import Options
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+
+from authenticate.id_itmo_ru import (
+    ID_ITMO_URL_REDIRECT_PROFILE,
+    USER_AGENT_ID_AUTHENTICATION,
+    ITMOAuthenticator,
+)
+from authenticate.registry import DEFAULT_ACCOUNT, get_registry
+
+BROWSER_LOGIN_TIMEOUT_SECONDS: int = 60
+
+
+def create_driver(enable_custom_user_agent: bool = False) -> webdriver.Firefox:
+    logging.info("Initializing webdriver")
+    firefox_profile = Options()
+    if enable_custom_user_agent:
+        firefox_profile.set_preference(
+            "general.useragent.override",
+            USER_AGENT_ID_AUTHENTICATION,
+        )
+    driver = webdriver.Firefox(options=firefox_profile)
+    driver.implicitly_wait(10)
+    return driver
+
+
+def browser_login(
+    authenticator: ITMOAuthenticator,
+    timeout: int = BROWSER_LOGIN_TIMEOUT_SECONDS,
+    enable_custom_user_agent: bool = False,
+) -> None:
+    logging.info("Authenticating via webdriver")
+    driver = create_driver(enable_custom_user_agent)
+    try:
+        driver.get(url=authenticator.authorization_url())
+        WebDriverWait(driver, timeout).until(
+            EC.url_contains(ID_ITMO_URL_REDIRECT_PROFILE.__str__()),
+        )
+        callback_url = driver.current_url
+    finally:
+        driver.quit()
+    authenticator.fetch_token(callback_url)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Log in to ITMO ID in a browser and write the account token file",
+    )
+    parser.add_argument("--account", default=DEFAULT_ACCOUNT)
+    parser.add_argument("--timeout", type=int, default=BROWSER_LOGIN_TIMEOUT_SECONDS)
+    parser.add_argument("--custom-user-agent", action="store_true")
+    args = parser.parse_args()
+    browser_login(
+        get_registry().authenticator(args.account),
+        timeout=args.timeout,
+        enable_custom_user_agent=args.custom_user_agent,
+    )
+    logging.info("Wrote token for %s", args.account)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
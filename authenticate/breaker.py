@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from enum import IntEnum
+
+from metrics.pipeline import UPSTREAM_BREAKER_STATE, UPSTREAM_BREAKER_TRIPS
+
+BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS: float = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+
+class BreakerStates(IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitOpenError(RuntimeError):
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"Upstream {name} is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_SECONDS,
+    ) -> None:
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._state = BreakerStates.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        UPSTREAM_BREAKER_STATE.labels(name).set(self._state)
+
+    @property
+    def state(self) -> BreakerStates:
+        return self._state
+
+    def _set_state(self, state: BreakerStates) -> None:
+        if state is not self._state:
+            logging.warning(
+                "Circuit breaker for %s is now %s",
+                self.name,
+                state.name.lower(),
+            )
+        self._state = state
+        UPSTREAM_BREAKER_STATE.labels(self.name).set(state)
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self._reset_timeout - time.monotonic())
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._state is BreakerStates.OPEN:
+                if self.retry_after() > 0:
+                    raise CircuitOpenError(self.name, self.retry_after())
+                self._set_state(BreakerStates.HALF_OPEN)
+            if self._state is BreakerStates.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError(self.name, self._reset_timeout)
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._set_state(BreakerStates.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if (
+                self._state is BreakerStates.HALF_OPEN
+                or self._failures >= self._failure_threshold
+            ):
+                if self._state is not BreakerStates.OPEN:
+                    UPSTREAM_BREAKER_TRIPS.labels(self.name).inc()
+                self._opened_at = time.monotonic()
+                self._set_state(BreakerStates.OPEN)
+
+    def release(self) -> None:
+        with self._lock:
+            self._probing = False
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics.pipeline import (
+    UPSTREAM_CONNECTIONS,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_REUSED_CONNECTIONS,
+)
+
+HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_MAX_RETRIES: int = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_RETRY_BACKOFF_FACTOR: float = float(os.getenv("HTTP_RETRY_BACKOFF_FACTOR", "0.3"))
+HTTP_RETRY_STATUS_CODES: tuple[int, ...] = (500, 502, 503, 504)
+
+
+def create_adapter(
+    pool_connections: int = HTTP_POOL_CONNECTIONS,
+    pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    max_retries: int = HTTP_MAX_RETRIES,
+    backoff_factor: float = HTTP_RETRY_BACKOFF_FACTOR,
+) -> HTTPAdapter:
+    return HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=HTTP_RETRY_STATUS_CODES,
+            raise_on_status=False,
+        ),
+    )
+
+
+def mount_adapter(session: requests.Session, adapter: HTTPAdapter) -> None:
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+
+ASYNC_CONNECTION_COUNTERS: dict[str, int] = {"requests": 0, "connections": 0}
+
+
+async def trace_async_connections(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        ASYNC_CONNECTION_COUNTERS["connections"] += 1
+    elif event_name == "http11.send_request_headers.started":
+        ASYNC_CONNECTION_COUNTERS["requests"] += 1
+
+
+def connection_stats(adapter: HTTPAdapter | None = None) -> dict[str, dict[str, int]]:
+    if adapter is None:
+        adapter = get_shared_adapter()
+    stats: dict[str, dict[str, int]] = {
+        "async": {
+            **ASYNC_CONNECTION_COUNTERS,
+            "reused": max(
+                ASYNC_CONNECTION_COUNTERS["requests"]
+                - ASYNC_CONNECTION_COUNTERS["connections"],
+                0,
+            ),
+        },
+    }
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+            "requests": pool.num_requests,
+            "connections": pool.num_connections,
+            "reused": max(pool.num_requests - pool.num_connections, 0),
+        }
+    return stats
+
+
+_EXPORTED_STATS: dict[str, tuple[int, int]] = {}
+_EXPORTED_STATS_LOCK = threading.Lock()
+
+
+def export_connection_stats(
+    stats: dict[str, dict[str, int]] | None = None,
+) -> dict[str, dict[str, int]]:
+    if stats is None:
+        stats = connection_stats()
+    with _EXPORTED_STATS_LOCK:
+        for pool, counters in stats.items():
+            requests_sent, connections = counters["requests"], counters["connections"]
+            previous_requests, previous_connections = _EXPORTED_STATS.get(pool, (0, 0))
+            if requests_sent < previous_requests or connections < previous_connections:
+                previous_requests, previous_connections = 0, 0
+            new_requests = requests_sent - previous_requests
+            new_connections = connections - previous_connections
+            if new_requests:
+                UPSTREAM_REQUESTS.labels(pool).inc(new_requests)
+            if new_connections:
+                UPSTREAM_CONNECTIONS.labels(pool).inc(new_connections)
+            if new_requests > new_connections:
+                UPSTREAM_REUSED_CONNECTIONS.labels(pool).inc(
+                    new_requests - new_connections,
+                )
+            _EXPORTED_STATS[pool] = (requests_sent, connections)
+    return stats
+
+
+_SHARED_ADAPTER: HTTPAdapter | None = None
+_SHARED_SESSION: requests.Session | None = None
+_SHARED_ASYNC_CLIENT: httpx.AsyncClient | None = None
+_SHARED_ASYNC_CLIENT_LOOP: asyncio.AbstractEventLoop | None = None
+_SHARED_LOCK = threading.Lock()
+
+
+def get_shared_adapter() -> HTTPAdapter:
+    global _SHARED_ADAPTER
+    if _SHARED_ADAPTER is None:
+        with _SHARED_LOCK:
+            if _SHARED_ADAPTER is None:
+                _SHARED_ADAPTER = create_adapter()
+                logging.info(
+                    "Created HTTP connection pool (maxsize %d, retries %d)",
+                    HTTP_POOL_MAXSIZE,
+                    HTTP_MAX_RETRIES,
+                )
+    return _SHARED_ADAPTER
+
+
+def get_shared_session() -> requests.Session:
+    global _SHARED_SESSION
+    adapter = get_shared_adapter()
+    if _SHARED_SESSION is None:
+        with _SHARED_LOCK:
+            if _SHARED_SESSION is None:
+                session = requests.Session()
+                mount_adapter(session, adapter)
+                _SHARED_SESSION = session
+    return _SHARED_SESSION
+
+
+def get_shared_async_client() -> httpx.AsyncClient:
+    global _SHARED_ASYNC_CLIENT, _SHARED_ASYNC_CLIENT_LOOP
+    loop = asyncio.get_running_loop()
+    if (
+        _SHARED_ASYNC_CLIENT is None
+        or _SHARED_ASYNC_CLIENT.is_closed
+        or _SHARED_ASYNC_CLIENT_LOOP is not loop
+    ):
+        _SHARED_ASYNC_CLIENT_LOOP = loop
+        _SHARED_ASYNC_CLIENT = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                ),
+                retries=HTTP_MAX_RETRIES,
+            ),
+        )
+        logging.info(
+            "Created async HTTP connection pool (maxsize %d)",
+            HTTP_POOL_MAXSIZE,
+        )
+    return _SHARED_ASYNC_CLIENT
+
+
+async def close_shared_async_client() -> None:
+    global _SHARED_ASYNC_CLIENT, _SHARED_ASYNC_CLIENT_LOOP
+    if (
+        _SHARED_ASYNC_CLIENT is not None
+        and _SHARED_ASYNC_CLIENT_LOOP is asyncio.get_running_loop()
+    ):
+        await _SHARED_ASYNC_CLIENT.aclose()
+    _SHARED_ASYNC_CLIENT = None
+    _SHARED_ASYNC_CLIENT_LOOP = None
@@ -1,28 +1,45 @@
+import asyncio
 import json
 import logging
-from datetime import datetime, timezone
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+import httpx
 import requests
 from pydantic import BaseModel, Field, HttpUrl, NonNegativeInt
 from requests_oauthlib import OAuth2Session
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
 
+from authenticate.http import (
+    HTTP_MAX_RETRIES,
+    HTTP_RETRY_BACKOFF_FACTOR,
+    HTTP_RETRY_STATUS_CODES,
+    get_shared_adapter,
+    get_shared_async_client,
+    get_shared_session,
+    mount_adapter,
+    trace_async_connections,
+)
+from caching.locks import file_lock
+from metrics.pipeline import stage
+
+ID_ITMO_BASE_URL: str = os.getenv("ID_ITMO_BASE_URL", "https://id.itmo.ru").rstrip("/")
 ID_ITMO_URL_AUTHORIZATION_ENDPOINT: str = (
-    "https://id.itmo.ru/auth/realms/itmo/protocol/openid-connect/auth"
+    f"{ID_ITMO_BASE_URL}/auth/realms/itmo/protocol/openid-connect/auth"
 )
 
 ID_ITMO_URL_TOKEN_ENDPOINT: str = (
-    "https://id.itmo.ru/auth/realms/itmo/protocol/openid-connect/token"
+    f"{ID_ITMO_BASE_URL}/auth/realms/itmo/protocol/openid-connect/token"
 )
-ID_ITMO_URL_REDIRECT_PROFILE: str = "https://id.itmo.ru/login/callback"
+ID_ITMO_URL_REDIRECT_PROFILE: str = f"{ID_ITMO_BASE_URL}/login/callback"
 
 USER_AGENT_ID_AUTHENTICATION: str = "isu2cal/1.0 (ReIdAp/1.2)"
 USER_AGENT_GENERAL_REQUEST: str = "isu2cal/1.0"
 
+TOKEN_REFRESH_SKEW_SECONDS: int = int(os.getenv("TOKEN_REFRESH_SKEW_SECONDS", "60"))
+
 
 class TokenResponseModel(BaseModel):
     access_token: str
@@ -45,6 +62,8 @@ class ITMOAuthenticator:
         scope: tuple[str, ...]
         | list[str] = ("openid", "profile", "email", "offline_access"),
         token_file: Path = Path("id_itmo_ru-token.json"),
+        refresh_skew: timedelta = timedelta(seconds=TOKEN_REFRESH_SKEW_SECONDS),
+        session: requests.Session | None = None,
     ) -> None:
         self._client_id: str = client_id
         self._client_secret: str = client_secret if client_secret else ""
@@ -54,33 +73,34 @@ class ITMOAuthenticator:
             redirect_uri=ID_ITMO_URL_REDIRECT_PROFILE,
             scope=self._scope,
         )
+        mount_adapter(self.__oauth_session, get_shared_adapter())
+        self._session = session if session is not None else get_shared_session()
         self.__access_token: str | None = None
         self.__refresh_token: str | None = None
         self._token_type: str | None = None
         self._expires_at: datetime | None = None
         self._token_file = token_file
+        self._refresh_skew = refresh_skew
+        self._refresh_lock = threading.Lock()
+        self.__saved_token_data: dict | None = None
         self.__load_token()
 
-    def __post_init__(self, enable_custom_user_agent: bool = False) -> None:
-        logging.info("Initializing webdriver")
-        firefox_profile = Options()
-        if enable_custom_user_agent:
-            firefox_profile.set_preference(
-                "general.useragent.override",
-                USER_AGENT_ID_AUTHENTICATION,
-            )
-        self.__driver = webdriver.Firefox(options=firefox_profile)
-        self.__driver.implicitly_wait(10)
-
     def __load_token(self) -> None:
         logging.info("Loading token from file: %s", self._token_file)
         if self._token_file.exists():
-            with open(self._token_file) as f:
+            with stage("token_load"), open(self._token_file) as f:
                 token_data = json.load(f)
                 self.__access_token = token_data.get("access_token")
                 self.__refresh_token = token_data.get("refresh_token")
                 self._token_type = token_data.get("token_type")
-                self._expires_at = datetime.fromisoformat(token_data.get("expires_at"))
+                self._expires_at = (
+                    datetime.fromisoformat(token_data["expires_at"])
+                    if token_data.get("expires_at")
+                    else None
+                )
+                if self._expires_at is not None and self._expires_at.tzinfo is None:
+                    self._expires_at = self._expires_at.replace(tzinfo=timezone.utc)
+                self.__saved_token_data = token_data
 
     def __save_token(self) -> None:
         token_data = {
@@ -89,8 +109,24 @@ class ITMOAuthenticator:
             "token_type": self._token_type,
             "expires_at": self._expires_at.isoformat() if self._expires_at else None,
         }
-        with open(self._token_file, "w") as f:
-            json.dump(token_data, f)
+        if token_data == self.__saved_token_data:
+            logging.debug("Token unchanged, skipping write to %s", self._token_file)
+            return
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._token_file.parent,
+            prefix=f".{self._token_file.name}.",
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(token_data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._token_file)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        self.__saved_token_data = token_data
 
     def __update_tokens(self, token: TokenResponseModel) -> None:
         self.__access_token = token.access_token
@@ -100,24 +136,36 @@ class ITMOAuthenticator:
         self.__save_token()
 
     def token_exists_and_is_valid(self) -> bool:
-        if self._token_file.exists():
+        if self.__refresh_token is None and not self._token_file.exists():
+            return False
+        self.ensure_fresh()
+        return True
+
+    def ensure_fresh(self) -> None:
+        if not self.is_expired():
+            return
+        with self._refresh_lock, file_lock(self._token_file):
+            self.__load_token()
             if self.is_expired():
                 self.refresh()
-            return True
-        return False
 
-    def authenticate(self) -> None:
-        logging.info("Authenticating via webdriver")
-        self.__post_init__()
+    async def atoken_exists_and_is_valid(self) -> bool:
+        if self.__refresh_token is None and not self._token_file.exists():
+            return False
+        await self.aensure_fresh()
+        return True
+
+    async def aensure_fresh(self) -> None:
+        if self.is_expired():
+            await asyncio.to_thread(self.ensure_fresh)
+
+    def authorization_url(self) -> str:
         authorization_url, _ = self.__oauth_session.authorization_url(
             url=ID_ITMO_URL_AUTHORIZATION_ENDPOINT,
         )
-        self.__driver.get(url=authorization_url)
-        WebDriverWait(self.__driver, 60).until(
-            EC.url_contains(ID_ITMO_URL_REDIRECT_PROFILE.__str__()),
-        )
-        callback_url = self.__driver.current_url
-        self.__driver.close()
+        return authorization_url
+
+    def fetch_token(self, callback_url: str) -> None:
         token: TokenResponseModel = TokenResponseModel(
             **self.__oauth_session.fetch_token(
                 token_url=ID_ITMO_URL_TOKEN_ENDPOINT,
@@ -130,32 +178,56 @@ class ITMOAuthenticator:
                 client_secret=self._client_secret,
             ),
         )
-        self.__update_tokens(token)
-        self.__del_wd()
+        with self._refresh_lock, file_lock(self._token_file):
+            self.__update_tokens(token)
+
+    def authenticate(self) -> None:
+        from authenticate.bootstrap import browser_login
+
+        browser_login(self)
 
     def refresh(self) -> None:
-        token: TokenResponseModel = TokenResponseModel(
-            **self.__oauth_session.refresh_token(
-                token_url=ID_ITMO_URL_TOKEN_ENDPOINT,
-                refresh_token=self.__refresh_token,
-                headers={
-                    "User-Agent": USER_AGENT_ID_AUTHENTICATION,
-                },
-                client_id=self._client_id,
-                client_secret=self._client_secret,
-            ),
-        )
+        with stage("token_refresh"):
+            token: TokenResponseModel = TokenResponseModel(
+                **self.__oauth_session.refresh_token(
+                    token_url=ID_ITMO_URL_TOKEN_ENDPOINT,
+                    refresh_token=self.__refresh_token,
+                    headers={
+                        "User-Agent": USER_AGENT_ID_AUTHENTICATION,
+                    },
+                    client_id=self._client_id,
+                    client_secret=self._client_secret,
+                ),
+            )
         logging.info("Refreshed token: acess valid until %s", token.expires_at)
         self.__update_tokens(token)
 
     def is_expired(self, override_expiration_check: bool = False) -> bool:
-        if not override_expiration_check and (
-            self.__access_token is not None and self._expires_at
-            if self._expires_at is not None
-            else datetime.now(tz=timezone.utc) < datetime.now(tz=timezone.utc)
+        if (
+            override_expiration_check
+            or self.__access_token is None
+            or self._expires_at is None
         ):
-            return False
-        return True
+            return True
+        return datetime.now(tz=timezone.utc) >= self._expires_at - self._refresh_skew
+
+    def __request_headers(
+        self,
+        user_agent: str,
+        language: str,
+        headers: dict | None,
+    ) -> dict:
+        if headers is None:
+            headers = {}
+        headers.update(
+            {
+                "Authorization": f"{self._token_type} {self.__access_token}",
+                "User-Agent": user_agent,
+                "Accept": "application/json",
+                "Accept-Language": language,
+            },
+        )
+        return headers
 
     def request(
         self,
@@ -168,25 +240,16 @@ class ITMOAuthenticator:
         cookies: dict | None = None,
         **kwargs,
     ) -> requests.Response:
-        if headers is None:
-            headers = {}
+        headers = self.__request_headers(user_agent, language, headers)
         if cookies is None:
             cookies = {}
-        headers.update(
-            {
-                "Authorization": f"{self._token_type} {self.__access_token}",
-                "User-Agent": user_agent,
-                "Accept": "application/json",
-                "Accept-Language": language,
-            },
-        )
         cookies.update(
             {
                 "locale": language,
             },
         )
         logging.info("Sending request to %s", url)
-        return requests.request(
+        return self._session.request(
             method,
             url.__str__(),
             headers=headers,
@@ -195,5 +258,39 @@ class ITMOAuthenticator:
             **kwargs,
         )
 
-    def __del_wd(self) -> None:
-        self.__driver.quit()
+    async def arequest(
+        self,
+        method: str,
+        url: HttpUrl | str,
+        timeout: NonNegativeInt = 20,
+        user_agent: str = USER_AGENT_GENERAL_REQUEST,
+        language: str = "en",
+        headers: dict | None = None,
+        **kwargs,
+    ) -> httpx.Response:
+        headers = self.__request_headers(user_agent, language, headers)
+        headers["Cookie"] = f"locale={language}"
+        client = get_shared_async_client()
+        logging.info("Sending async request to %s", url)
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            response = await client.request(
+                method,
+                url.__str__(),
+                headers=headers,
+                timeout=timeout,
+                extensions={"trace": trace_async_connections},
+                **kwargs,
+            )
+            if (
+                response.status_code not in HTTP_RETRY_STATUS_CODES
+                or method.upper() not in ("GET", "HEAD")
+                or attempt == HTTP_MAX_RETRIES
+            ):
+                return response
+            logging.warning(
+                "Retrying %s after status %d",
+                url,
+                response.status_code,
+            )
+            await asyncio.sleep(HTTP_RETRY_BACKOFF_FACTOR * 2**attempt)
+        return response
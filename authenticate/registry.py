@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from authenticate.id_itmo_ru import ITMOAuthenticator
+
+ACCOUNTS_FILE: str = os.getenv("ACCOUNTS_FILE", "accounts.json")
+AUTHENTICATOR_POOL_SIZE: int = int(os.getenv("AUTHENTICATOR_POOL_SIZE", "32"))
+DEFAULT_ACCOUNT: str = "default"
+DEFAULT_TOKEN_FILE: Path = Path("id_itmo_ru-token.json")
+
+
+class Account(BaseModel):
+    name: str
+    api_key: str | None = None
+    token_file: Path
+
+
+class AccountRegistry:
+    def __init__(
+        self,
+        accounts: list[Account],
+        pool_size: int = AUTHENTICATOR_POOL_SIZE,
+    ) -> None:
+        self._accounts: dict[str, Account] = {
+            account.name: account for account in accounts
+        }
+        self._accounts_by_key: dict[str, Account] = {
+            account.api_key: account
+            for account in accounts
+            if account.api_key is not None
+        }
+        self._pool_size = pool_size
+        self._authenticators: OrderedDict[str, ITMOAuthenticator] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AccountRegistry":
+        accounts: list[Account] = []
+        accounts_file = Path(ACCOUNTS_FILE)
+        if accounts_file.exists():
+            with accounts_file.open() as f:
+                accounts.extend(Account(**account) for account in json.load(f))
+        if all(account.name != DEFAULT_ACCOUNT for account in accounts):
+            accounts.append(
+                Account(
+                    name=DEFAULT_ACCOUNT,
+                    api_key=os.getenv("API_KEY") or None,
+                    token_file=DEFAULT_TOKEN_FILE,
+                ),
+            )
+        logging.info("Loaded %d accounts", len(accounts))
+        return cls(accounts)
+
+    def names(self) -> list[str]:
+        return list(self._accounts)
+
+    def served_names(self) -> list[str]:
+        return [account.name for account in self._accounts_by_key.values()]
+
+    def has_api_keys(self) -> bool:
+        return bool(self._accounts_by_key)
+
+    def account_for_key(self, api_key: str) -> Account | None:
+        return self._accounts_by_key.get(api_key)
+
+    def authenticator(self, name: str) -> ITMOAuthenticator:
+        with self._lock:
+            authenticator = self._authenticators.get(name)
+            if authenticator is not None:
+                self._authenticators.move_to_end(name)
+                return authenticator
+            account = self._accounts.get(name)
+            if account is None:
+                msg = f"Unknown account: {name}"
+                raise KeyError(msg)
+            authenticator = ITMOAuthenticator(
+                client_id="profile",
+                client_secret=None,
+                token_file=account.token_file,
+            )
+            self._authenticators[name] = authenticator
+            while len(self._authenticators) > self._pool_size:
+                evicted, _ = self._authenticators.popitem(last=False)
+                logging.debug("Evicted %s authenticator from pool", evicted)
+            logging.info("Initialized authenticator for %s", name)
+            return authenticator
+
+
+_REGISTRY: AccountRegistry | None = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> AccountRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = AccountRegistry.from_env()
+    return _REGISTRY
@@ -0,0 +1,38 @@
+import argparse
+import json
+import timeit
+from datetime import date
+
+from benchmarks.fixtures import generate_schedule_bytes
+from generate_calendar import parse_schedule
+from schedule.models import LessonRecord, Schedule
+
+
+def parse_schedule_legacy(schedule_response_content: bytes) -> list[LessonRecord]:
+    schedule_response_json = json.loads(schedule_response_content)
+    for day in schedule_response_json["data"]:
+        for lesson in day["lessons"]:
+            lesson["date"] = day["date"]
+    schedule = Schedule(**schedule_response_json)
+    return [lesson.to_record() for day in schedule.data for lesson in day.lessons]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare schedule parsing paths")
+    parser.add_argument("--days", type=int, default=140)
+    parser.add_argument("--lessons-per-day", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    content = generate_schedule_bytes(date(2023, 9, 1), args.days, args.lessons_per_day)
+    legacy, fast = parse_schedule_legacy(content), parse_schedule(content)
+    if legacy != fast:
+        msg = "Fast parser output differs from the legacy parser"
+        raise AssertionError(msg)
+    print(f"{len(fast)} lessons, {len(content)} bytes")
+    for name, func in (("legacy", parse_schedule_legacy), ("fast", parse_schedule)):
+        best = min(timeit.repeat(lambda: func(content), number=1, repeat=args.repeat))
+        print(f"{name:>8}: {best * 1000:8.2f} ms ({best / len(fast) * 1e6:.2f} us/lesson)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from benchmarks.fixtures import generate_schedule_bytes, write_accounts
+from benchmarks.stub_upstream import StubUpstream
+
+BENCH_START_DATE: date = date(2023, 9, 1)
+BENCH_RANGES: dict[str, int] = {
+    "day": 1,
+    "week": 7,
+    "month": 31,
+    "term": 140,
+    "year": 365,
+    "three-years": 1095,
+}
+BENCH_API_KEY: str = "bench"
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        "min_seconds": timings[0],
+        "median_seconds": timings[len(timings) // 2],
+        "peak_bytes": peak,
+    }
+
+
+def bench_stages(days: int, lessons_per_day: int, repeat: int) -> dict[str, dict]:
+    from custom_i18n.langs import Languages
+    from generate_calendar import parse_schedule
+    from ics_calendar.cal import create_calendar
+
+    content = generate_schedule_bytes(BENCH_START_DATE, days, lessons_per_day)
+    lessons = parse_schedule(content)
+    results = {
+        "parse": measure(lambda: parse_schedule(content), repeat),
+    }
+    for language in Languages:
+        calendar = create_calendar(language, lessons)
+        results[f"create_calendar_{language.value}"] = measure(
+            lambda: create_calendar(language, lessons),
+            repeat,
+        )
+        results[f"serialize_{language.value}"] = measure(calendar.serialize, repeat)
+    for result in results.values():
+        result.update(lessons=len(lessons), payload_bytes=len(content))
+    return results
+
+
+def configure_route_env(workdir: Path) -> None:
+    accounts_file = write_accounts(workdir, BENCH_API_KEY)
+    os.environ["ACCOUNTS_FILE"] = str(accounts_file)
+    os.environ["DAY_STORE_PATH"] = ""
+    os.environ["PREFETCH_ENABLED"] = "0"
+    os.environ["STREAMING_MIN_DAYS"] = "0"
+    os.environ["API_KEY_RATE_LIMIT_PER_MINUTE"] = "0"
+
+
+def bench_route(ranges: dict[str, int], repeat: int) -> dict[str, dict]:
+    with StubUpstream() as upstream:
+        from fastapi.testclient import TestClient
+
+        import generate_calendar
+        import main
+
+        generate_calendar.SCHEDULE_API_URL_PERSONAL = upstream.schedule_url
+        results = {}
+        with TestClient(main.app) as client:
+            for name, days in ranges.items():
+                end = BENCH_START_DATE + timedelta(days=days - 1)
+                url = f"/{BENCH_API_KEY}/{BENCH_START_DATE}/{end}/en/schedule.ics"
+
+                def cold_request() -> None:
+                    main.RESPONSE_CACHES.clear()
+                    generate_calendar._RENDERED_EVENTS.clear()
+                    generate_calendar._LESSON_INDEXES.clear()
+                    generate_calendar._UPSTREAM_SNAPSHOTS.clear()
+                    client.get(url).raise_for_status()
+
+                cold_request()
+                results[f"route_cold_{name}"] = measure(cold_request, repeat)
+                results[f"route_cached_{name}"] = measure(
+                    lambda: client.get(url).raise_for_status(),
+                    repeat,
+                )
+        return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    regressions = 0
+    for name, result in sorted(current["results"].items()):
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        ratio = result["min_seconds"] / previous["min_seconds"]
+        marker = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(marker)
+        print(
+            f"{name:>32}: {previous['min_seconds'] * 1000:10.3f} ms -> "
+            f"{result['min_seconds'] * 1000:10.3f} ms ({ratio:5.2f}x) {marker}",
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the schedule-to-ICS pipeline")
+    parser.add_argument("--ranges", nargs="+", choices=BENCH_RANGES, default=list(BENCH_RANGES))
+    parser.add_argument("--lessons-per-day", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-route", action="store_true")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path)
+    parser.add_argument("--threshold", type=float, default=1.2)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    ranges = {name: BENCH_RANGES[name] for name in args.ranges}
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_route_env(Path(workdir))
+        for name, days in ranges.items():
+            stages = bench_stages(days, args.lessons_per_day, args.repeat)
+            for stage, result in stages.items():
+                results[f"{stage}_{name}"] = result
+        if not args.skip_route:
+            results.update(bench_route(ranges, args.repeat))
+    report = {
+        "revision": git_revision(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "created_at": datetime.now(tz=timezone.utc).isoformat(),
+        "lessons_per_day": args.lessons_per_day,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    for name, result in results.items():
+        print(
+            f"{name:>32}: {result['min_seconds'] * 1000:10.3f} ms "
+            f"(median {result['median_seconds'] * 1000:10.3f} ms, "
+            f"peak {result['peak_bytes'] / 1024:10.1f} KiB)",
+        )
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text())
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
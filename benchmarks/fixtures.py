@@ -0,0 +1,145 @@
+import json
+import random
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+SUBJECTS: tuple[str, ...] = (
+    "Математический анализ",
+    "Линейная алгебра",
+    "Программирование",
+    "Алгоритмы и структуры данных",
+    "Дискретная математика",
+    "Физическая культура",
+    "Иностранный язык",
+    "Основы компьютерной графики и визуализации",
+)
+TEACHERS: tuple[str, ...] = (
+    "Иванов Иван Иванович",
+    "Петрова Мария Сергеевна",
+    "Сидоров Алексей Викторович",
+    "Smith John",
+)
+BUILDINGS: tuple[tuple[int, str], ...] = (
+    (1, "Биржевая линия, д.14, лит.А"),
+    (13, "Кронверкский пр., д.49, лит.А"),
+    (23, "ул.Ломоносова, д.9, лит. А"),
+    (37, "ул.Ломоносова, д.9, лит. М"),
+)
+FORMATS: tuple[tuple[int, str], ...] = (
+    (1, "Очный"),
+    (2, "Очно - дистанционный "),
+    (3, "Дистанционный "),
+)
+WORK_TYPES: tuple[tuple[int, str], ...] = (
+    (1, "Лекции"),
+    (2, "Лабораторные занятия"),
+    (3, "Практические занятия"),
+    (11, "Занятия спортом"),
+)
+PAIR_TIMES: tuple[tuple[str, str], ...] = (
+    ("08:20", "09:50"),
+    ("10:00", "11:30"),
+    ("11:40", "13:10"),
+    ("13:30", "15:00"),
+    ("15:20", "16:50"),
+    ("17:00", "18:30"),
+    ("18:40", "20:10"),
+)
+
+
+def generate_lesson(rng: random.Random, day: date, pair: int) -> dict:
+    subject_id = rng.randrange(len(SUBJECTS))
+    bld_id, building = rng.choice(BUILDINGS)
+    format_id, format_name = rng.choice(FORMATS)
+    work_type_id, work_type = rng.choice(WORK_TYPES)
+    distant = format_id != 1
+    time_start, time_end = PAIR_TIMES[pair]
+    return {
+        "pair_id": day.toordinal() * 10 + pair,
+        "subject": SUBJECTS[subject_id],
+        "subject_id": 1000 + subject_id,
+        "note": rng.choice((None, None, "Перенос; аудитория уточняется, см. ИСУ")),
+        "time_start": time_start,
+        "time_end": time_end,
+        "teacher_name": rng.choice((*TEACHERS, None)),
+        "teacher_id": rng.randrange(100000, 999999),
+        "room": None if distant else str(rng.randrange(1100, 2500)),
+        "building": None if distant else building,
+        "bld_id": None if distant else bld_id,
+        "main_bld_id": None if distant else bld_id,
+        "format": format_name,
+        "format_id": format_id,
+        "type": None,
+        "work_type": work_type,
+        "work_type_id": work_type_id,
+        "group": f"M31{rng.randrange(10):02d} ",
+        "flow_type_id": rng.randrange(1, 4),
+        "flow_id": rng.randrange(10000, 99999),
+        "zoom_url": f"https://itmo.zoom.us/j/{rng.randrange(10**10)}" if distant else None,
+        "zoom_password": f"{rng.randrange(10**6):06d}" if distant else None,
+        "zoom_info": None,
+    }
+
+
+def generate_schedule(
+    start: date,
+    days: int,
+    lessons_per_day: int = 4,
+    seed: int = 0,
+) -> dict:
+    rng = random.Random(seed)
+    data = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        if day.weekday() == 6:
+            continue
+        pairs = sorted(rng.sample(range(len(PAIR_TIMES)), lessons_per_day))
+        data.append(
+            {
+                "day_number": day.isoweekday(),
+                "week_number": offset // 7 + 1,
+                "date": day.isoformat(),
+                "note": None,
+                "type": None,
+                "lessons": [generate_lesson(rng, day, pair) for pair in pairs],
+                "intersections": None,
+            },
+        )
+    return {"code": 0, "data": data, "message": None}
+
+
+def generate_schedule_bytes(
+    start: date,
+    days: int,
+    lessons_per_day: int = 4,
+    seed: int = 0,
+) -> bytes:
+    return json.dumps(
+        generate_schedule(start, days, lessons_per_day, seed),
+        ensure_ascii=False,
+    ).encode()
+
+
+def write_accounts(
+    workdir: Path,
+    api_key: str,
+    token_lifetime: timedelta = timedelta(days=1),
+) -> Path:
+    token_file = workdir / "token.json"
+    token_file.write_text(
+        json.dumps(
+            {
+                "access_token": "bench",
+                "refresh_token": "bench",
+                "token_type": "Bearer",
+                "expires_at": (datetime.now(tz=timezone.utc) + token_lifetime).isoformat(),
+            },
+        ),
+    )
+    accounts_file = workdir / "accounts.json"
+    accounts_file.write_text(
+        json.dumps(
+            [{"name": "default", "api_key": api_key, "token_file": str(token_file)}],
+        ),
+    )
+    return accounts_file
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fixtures import write_accounts
+from benchmarks.stub_upstream import StubUpstream
+
+LOAD_TEST_API_KEY: str = "load-test"
+LOAD_TEST_START_DATE: date = date(2023, 9, 4)
+
+
+def calendar_paths(api_key: str, ranges: list[int], languages: list[str]) -> list[str]:
+    return [
+        f"/{api_key}/{LOAD_TEST_START_DATE}/"
+        f"{LOAD_TEST_START_DATE + timedelta(days=days - 1)}/{language}/schedule.ics"
+        for days in ranges
+        for language in languages
+    ]
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def drive(
+    base_url: str,
+    paths: list[str],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> dict:
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+    limits = httpx.Limits(
+        max_connections=concurrency,
+        max_keepalive_connections=concurrency,
+    )
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def worker(offset: int, deadline: float, record: bool) -> None:
+            index = offset
+            while time.perf_counter() < deadline:
+                path = paths[index % len(paths)]
+                index += concurrency
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    status = str(response.status_code)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if record:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] += 1
+
+        if warmup:
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*(worker(i, deadline, False) for i in range(concurrency)))
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(worker(i, deadline, True) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "duration_seconds": elapsed,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "statuses": dict(statuses),
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            msg = f"Service exited with code {process.returncode}"
+            raise RuntimeError(msg)
+        try:
+            httpx.get(f"{base_url}/", timeout=1).raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    msg = f"Service at {base_url} did not become ready in {timeout} seconds"
+    raise TimeoutError(msg)
+
+
+def serve(
+    stack: ExitStack,
+    args: argparse.Namespace,
+    workdir: Path,
+) -> str:
+    upstream = stack.enter_context(
+        StubUpstream(
+            latency=args.upstream_latency_ms / 1000,
+            error_rate=args.upstream_error_rate,
+            lessons_per_day=args.lessons_per_day,
+            token_lifetime=args.token_lifetime,
+        ),
+    )
+    env = {
+        **os.environ,
+        "ACCOUNTS_FILE": str(
+            write_accounts(
+                workdir,
+                args.api_key,
+                timedelta(seconds=args.token_lifetime),
+            ),
+        ),
+        "ID_ITMO_BASE_URL": upstream.base_url,
+        "SCHEDULE_API_BASE_URL": upstream.base_url,
+        "OAUTHLIB_INSECURE_TRANSPORT": "1",
+        "DAY_STORE_PATH": str(workdir / "schedule-days.sqlite3"),
+        "PREFETCH_LEADER_FILE": str(workdir / "prefetch"),
+        "API_KEY_RATE_LIMIT_PER_MINUTE": str(args.rate_limit_per_minute),
+    }
+    if args.admission_concurrency is not None:
+        env["ADMISSION_MAX_CONCURRENCY"] = str(args.admission_concurrency)
+    if args.shared_cache:
+        env["CALENDAR_CACHE_DIR"] = str(workdir / "calendar-cache")
+    log = (
+        stack.enter_context(args.service_log.open("w"))
+        if args.service_log is not None
+        else subprocess.DEVNULL
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+        stdout=log,
+        stderr=log,
+    )
+    stack.callback(process.wait, 30)
+    stack.callback(process.terminate)
+    base_url = f"http://127.0.0.1:{args.port}"
+    wait_until_ready(base_url, process, timeout=30)
+    stack.callback(lambda: print(f"Upstream handled {upstream.server.requests}"))
+    return base_url
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load-test the calendar service")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8080")
+    parser.add_argument("--api-key", default=LOAD_TEST_API_KEY)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--ranges", type=int, nargs="+", default=[7, 14, 31])
+    parser.add_argument("--languages", nargs="+", default=["en", "ru"])
+    parser.add_argument("--output", type=Path)
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="start the fake upstream and a uvicorn service instead of using --base-url",
+    )
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--lessons-per-day", type=int, default=4)
+    parser.add_argument("--token-lifetime", type=int, default=300)
+    parser.add_argument("--service-log", type=Path)
+    parser.add_argument(
+        "--rate-limit-per-minute",
+        type=float,
+        default=0.0,
+        help="per-API-key rate limit of the served instance, 0 disables it",
+    )
+    parser.add_argument(
+        "--admission-concurrency",
+        type=int,
+        help="concurrent pipeline executions per worker of the served instance",
+    )
+    parser.add_argument(
+        "--shared-cache",
+        action="store_true",
+        help="share rendered calendars between workers through CALENDAR_CACHE_DIR",
+    )
+    args = parser.parse_args()
+    with ExitStack() as stack:
+        base_url = args.base_url
+        if args.serve:
+            workdir = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+            base_url = serve(stack, args, workdir)
+        report = asyncio.run(
+            drive(
+                base_url,
+                calendar_paths(args.api_key, args.ranges, args.languages),
+                args.concurrency,
+                args.duration,
+                args.warmup,
+            ),
+        )
+    report["workers"] = args.workers if args.serve else None
+    latency = report["latency_seconds"]
+    print(
+        f"{report['requests']} requests in {report['duration_seconds']:.1f} s "
+        f"at concurrency {report['concurrency']}: "
+        f"{report['throughput_rps']:.1f} req/s, "
+        f"p50 {latency['p50'] * 1000:.1f} ms, "
+        f"p90 {latency['p90'] * 1000:.1f} ms, "
+        f"p99 {latency['p99'] * 1000:.1f} ms, "
+        f"statuses {report['statuses']}",
+    )
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
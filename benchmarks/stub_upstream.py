@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fixtures import generate_schedule_bytes
+
+STUB_SCHEDULE_PATH: str = "/api/v3/schedule/personal"
+STUB_TOKEN_PATH: str = "/auth/realms/itmo/protocol/openid-connect/token"
+
+
+@lru_cache(maxsize=64)
+def schedule_bytes(start: date, end: date, lessons_per_day: int) -> bytes:
+    return generate_schedule_bytes(start, (end - start).days + 1, lessons_per_day)
+
+
+@lru_cache(maxsize=64)
+def schedule_etag(start: date, end: date, lessons_per_day: int) -> str:
+    content = schedule_bytes(start, end, lessons_per_day)
+    return f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+
+def token_payload(lifetime: int) -> dict:
+    return {
+        "access_token": secrets.token_urlsafe(32),
+        "expires_in": lifetime,
+        "refresh_expires_in": lifetime * 10,
+        "refresh_token": secrets.token_urlsafe(32),
+        "token_type": "Bearer",
+        "id_token": secrets.token_urlsafe(32),
+        "not-before-policy": 0,
+        "session_state": secrets.token_hex(16),
+        "scope": "openid profile email offline_access",
+        "expires_at": (
+            datetime.now(tz=timezone.utc) + timedelta(seconds=lifetime)
+        ).isoformat(),
+    }
+
+
+class StubUpstreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        lessons_per_day: int = 4,
+        token_lifetime: int = 300,
+    ) -> None:
+        super().__init__(address, StubUpstreamHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lessons_per_day = lessons_per_day
+        self.token_lifetime = token_lifetime
+        self.requests: dict[str, int] = {
+            "schedule": 0,
+            "not_modified": 0,
+            "token": 0,
+            "errors": 0,
+        }
+        self._requests_lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._requests_lock:
+            self.requests[name] += 1
+
+
+class StubUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: StubUpstreamServer
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path != STUB_SCHEDULE_PATH:
+            self.send_error(404)
+            return
+        self.server.count("schedule")
+        if self.simulate_upstream():
+            return
+        query = parse_qs(url.query)
+        schedule_range = (
+            date.fromisoformat(query["date_start"][0]),
+            date.fromisoformat(query["date_end"][0]),
+            self.server.lessons_per_day,
+        )
+        etag = schedule_etag(*schedule_range)
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count("not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_json(schedule_bytes(*schedule_range), {"ETag": etag})
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        if urlparse(self.path).path != STUB_TOKEN_PATH:
+            self.send_error(404)
+            return
+        self.server.count("token")
+        if self.simulate_upstream():
+            return
+        self.send_json(json.dumps(token_payload(self.server.token_lifetime)).encode())
+
+    def simulate_upstream(self) -> bool:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            self.server.count("errors")
+            self.send_error(503)
+            return True
+        return False
+
+    def send_json(self, content: bytes, headers: dict[str, str] | None = None) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class StubUpstream:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **options) -> None:
+        self.server = StubUpstreamServer((host, port), **options)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def schedule_url(self) -> str:
+        return f"{self.base_url}{STUB_SCHEDULE_PATH}"
+
+    def __enter__(self) -> "StubUpstream":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a fake ITMO ID and schedule API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--lessons-per-day", type=int, default=4)
+    parser.add_argument("--token-lifetime", type=int, default=300)
+    args = parser.parse_args()
+    server = StubUpstreamServer(
+        (args.host, args.port),
+        latency=args.latency_ms / 1000,
+        error_rate=args.error_rate,
+        lessons_per_day=args.lessons_per_day,
+        token_lifetime=args.token_lifetime,
+    )
+    print(f"Serving fake upstream on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Handled {server.requests}")
+
+
+if __name__ == "__main__":
+    main()
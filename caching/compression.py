@@ -0,0 +1,47 @@
+import gzip
+import os
+
+import brotli
+
+CALENDAR_COMPRESSION_MIN_BYTES: int = int(
+    os.getenv("CALENDAR_COMPRESSION_MIN_BYTES", "1024"),
+)
+CALENDAR_GZIP_LEVEL: int = int(os.getenv("CALENDAR_GZIP_LEVEL", "6"))
+CALENDAR_BROTLI_QUALITY: int = int(os.getenv("CALENDAR_BROTLI_QUALITY", "5"))
+CONTENT_ENCODINGS: tuple[str, ...] = ("br", "gzip")
+
+
+def compress_variants(content: bytes) -> dict[str, bytes]:
+    if len(content) < CALENDAR_COMPRESSION_MIN_BYTES:
+        return {}
+    return {
+        "br": brotli.compress(
+            content,
+            mode=brotli.MODE_TEXT,
+            quality=CALENDAR_BROTLI_QUALITY,
+        ),
+        "gzip": gzip.compress(content, compresslevel=CALENDAR_GZIP_LEVEL, mtime=0),
+    }
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        param = params.strip()
+        if param.startswith("q="):
+            try:
+                weight = float(param[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    wildcard = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in CONTENT_ENCODINGS:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
@@ -0,0 +1,232 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable
+from datetime import date, timedelta
+from pathlib import Path
+
+from caching.responses import CALENDAR_CACHE_TTL_SECONDS
+from custom_i18n.langs import Languages
+from ics_calendar.cal import EventState, advance_event_states
+from schedule.models import RAW_DAYS_ADAPTER, RawDay
+
+DAY_STORE_PATH: str = os.getenv("DAY_STORE_PATH", "schedule-days.sqlite3")
+DAY_STORE_TTL_SECONDS: float = float(
+    os.getenv("DAY_STORE_TTL_SECONDS", f"{CALENDAR_CACHE_TTL_SECONDS}"),
+)
+DAY_STORE_QUERY_CHUNK: int = 500
+
+
+def date_range(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+class DayStore:
+    def __init__(self, path: Path, ttl: float = DAY_STORE_TTL_SECONDS) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        columns = {
+            row[1]
+            for row in self._connection.execute("PRAGMA table_info(days)").fetchall()
+        }
+        if columns and "account" not in columns:
+            logging.info("Dropping day store table without account column")
+            self._connection.execute("DROP TABLE days")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS days ("
+            "account TEXT NOT NULL, "
+            "language TEXT NOT NULL, "
+            "date TEXT NOT NULL, "
+            "payload TEXT, "
+            "fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (account, language, date))",
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "account TEXT NOT NULL, "
+            "language TEXT NOT NULL, "
+            "uid TEXT NOT NULL, "
+            "content_hash TEXT NOT NULL, "
+            "sequence INTEGER NOT NULL, "
+            "last_modified TEXT NOT NULL, "
+            "PRIMARY KEY (account, language, uid))",
+        )
+        logging.info("Opened schedule day store at %s", path)
+
+    def _rows(
+        self,
+        account: str,
+        start: date,
+        end: date,
+        language: Languages,
+    ) -> dict[str, tuple[str | None, float]]:
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT date, payload, fetched_at FROM days "
+                "WHERE account = ? AND language = ? AND date BETWEEN ? AND ?",
+                (account, language.value, start.isoformat(), end.isoformat()),
+            )
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def missing_ranges(
+        self,
+        account: str,
+        start: date,
+        end: date,
+        language: Languages,
+    ) -> list[tuple[date, date]]:
+        rows = self._rows(account, start, end, language)
+        stale_before = time.time() - self.ttl
+        ranges: list[tuple[date, date]] = []
+        for day in date_range(start, end):
+            row = rows.get(day.isoformat())
+            if row is not None and row[1] >= stale_before:
+                continue
+            if ranges and ranges[-1][1] == day - timedelta(days=1):
+                ranges[-1] = (ranges[-1][0], day)
+            else:
+                ranges.append((day, day))
+        return ranges
+
+    def store(
+        self,
+        account: str,
+        start: date,
+        end: date,
+        language: Languages,
+        days: Iterable[RawDay],
+    ) -> None:
+        payloads: dict[str, str | None] = {
+            day.isoformat(): None for day in date_range(start, end)
+        }
+        for day in days:
+            payloads[day.date] = day.model_dump_json()
+        fetched_at = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO days "
+                "(account, language, date, payload, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (account, language.value, day, payload, fetched_at)
+                    for day, payload in payloads.items()
+                ],
+            )
+        logging.debug(
+            "Stored %d days (%d with lessons) for %s/%s",
+            len(payloads),
+            len(days),
+            account,
+            language,
+        )
+
+    def touch(
+        self,
+        account: str,
+        start: date,
+        end: date,
+        language: Languages,
+    ) -> int:
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE days SET fetched_at = ? "
+                "WHERE account = ? AND language = ? AND date BETWEEN ? AND ?",
+                (
+                    time.time(),
+                    account,
+                    language.value,
+                    start.isoformat(),
+                    end.isoformat(),
+                ),
+            )
+        return cursor.rowcount
+
+    def reconcile_events(
+        self,
+        account: str,
+        language: Languages,
+        hashes: dict[str, str],
+        now: str,
+    ) -> dict[str, EventState]:
+        uids = list(hashes)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                previous: dict[str, EventState] = {}
+                for offset in range(0, len(uids), DAY_STORE_QUERY_CHUNK):
+                    chunk = uids[offset : offset + DAY_STORE_QUERY_CHUNK]
+                    cursor = self._connection.execute(
+                        "SELECT uid, content_hash, sequence, last_modified "
+                        "FROM events WHERE account = ? AND language = ? "
+                        f"AND uid IN ({','.join('?' * len(chunk))})",
+                        (account, language.value, *chunk),
+                    )
+                    previous.update(
+                        (row[0], EventState(*row[1:])) for row in cursor.fetchall()
+                    )
+                states = advance_event_states(previous, hashes, now)
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO events "
+                    "(account, language, uid, content_hash, sequence, last_modified) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (account, language.value, uid, *state)
+                        for uid, state in states.items()
+                        if previous.get(uid) != state
+                    ],
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return states
+
+    def load_payloads(
+        self,
+        account: str,
+        start: date,
+        end: date,
+        language: Languages,
+    ) -> list[str]:
+        rows = self._rows(account, start, end, language)
+        return [rows[day][0] for day in sorted(rows) if rows[day][0] is not None]
+
+    def load(
+        self,
+        account: str,
+        start: date,
+        end: date,
+        language: Languages,
+    ) -> list[RawDay]:
+        return decode_payloads(self.load_payloads(account, start, end, language))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def decode_payloads(payloads: list[str]) -> list[RawDay]:
+    return RAW_DAYS_ADAPTER.validate_json(f"[{','.join(payloads)}]")
+
+
+_DAY_STORE: DayStore | None = None
+_DAY_STORE_LOCK = threading.Lock()
+
+
+def get_day_store() -> DayStore | None:
+    global _DAY_STORE
+    if not DAY_STORE_PATH:
+        return None
+    if _DAY_STORE is None:
+        with _DAY_STORE_LOCK:
+            if _DAY_STORE is None:
+                _DAY_STORE = DayStore(Path(DAY_STORE_PATH))
+    return _DAY_STORE
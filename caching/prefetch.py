@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import os
+import random
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import IO
+
+from caching.locks import try_hold_file_lock
+from custom_i18n.langs import Languages
+from ics_calendar.cal import get_week_range_datetimes
+
+PREFETCH_ENABLED: bool = os.getenv("PREFETCH_ENABLED", "0") == "1"
+PREFETCH_INTERVAL_SECONDS: float = float(os.getenv("PREFETCH_INTERVAL_SECONDS", "600"))
+PREFETCH_JITTER_SECONDS: float = float(os.getenv("PREFETCH_JITTER_SECONDS", "60"))
+PREFETCH_CONCURRENCY: int = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+PREFETCH_HOT_RANGES: int = int(os.getenv("PREFETCH_HOT_RANGES", "8"))
+PREFETCH_MAX_BACKOFF_SECONDS: float = float(
+    os.getenv("PREFETCH_MAX_BACKOFF_SECONDS", "3600"),
+)
+PREFETCH_LEADER_FILE: str = os.getenv("PREFETCH_LEADER_FILE", "prefetch")
+
+RangeKey = tuple[str, str, str, Languages]
+
+
+def default_ranges(accounts: list[str]) -> list[RangeKey]:
+    ranges: list[RangeKey] = []
+    for weeks_ahead in (0, 1):
+        start, end = get_week_range_datetimes(weeks_ahead=weeks_ahead)
+        for account in accounts:
+            for language in Languages:
+                ranges.append(
+                    (
+                        account,
+                        start.strftime("%Y-%m-%d"),
+                        end.strftime("%Y-%m-%d"),
+                        language,
+                    ),
+                )
+    return ranges
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        refresh: Callable[[str, str, str, Languages], Awaitable[object]],
+        accounts: Callable[[], list[str]],
+        interval: float = PREFETCH_INTERVAL_SECONDS,
+        jitter: float = PREFETCH_JITTER_SECONDS,
+        concurrency: int = PREFETCH_CONCURRENCY,
+        hot_ranges: int = PREFETCH_HOT_RANGES,
+        max_backoff: float = PREFETCH_MAX_BACKOFF_SECONDS,
+    ) -> None:
+        self._refresh = refresh
+        self._accounts = accounts
+        self._interval = interval
+        self._jitter = jitter
+        self._concurrency = concurrency
+        self._hot_ranges = hot_ranges
+        self._max_backoff = max_backoff
+        self._hits: dict[RangeKey, float] = {}
+        self._failures = 0
+        self._task: asyncio.Task | None = None
+        self._leader_lock: IO | None = None
+
+    def record(self, key: RangeKey) -> None:
+        self._hits[key] = self._hits.get(key, 0.0) + 1.0
+
+    def hot(self) -> list[RangeKey]:
+        return sorted(self._hits, key=self._hits.__getitem__, reverse=True)[
+            : self._hot_ranges
+        ]
+
+    def _decay_hits(self) -> None:
+        self._hits = {
+            key: hits / 2 for key, hits in self._hits.items() if hits / 2 >= 0.5
+        }
+
+    async def _refresh_one(self, semaphore: asyncio.Semaphore, key: RangeKey) -> bool:
+        async with semaphore:
+            try:
+                await self._refresh(*key)
+            except Exception:
+                logging.exception("Failed to prefetch %s", key)
+                return False
+        logging.debug("Prefetched %s", key)
+        return True
+
+    async def refresh_all(self) -> bool:
+        ranges = list(dict.fromkeys(default_ranges(self._accounts()) + self.hot()))
+        self._decay_hits()
+        semaphore = asyncio.Semaphore(self._concurrency)
+        results = await asyncio.gather(
+            *(self._refresh_one(semaphore, key) for key in ranges),
+        )
+        logging.info("Prefetched %d of %d ranges", sum(results), len(ranges))
+        return all(results)
+
+    def next_delay(self) -> float:
+        return min(
+            self._interval * 2**self._failures,
+            self._max_backoff,
+        ) + random.uniform(0, self._jitter)
+
+    async def run(self) -> None:
+        await asyncio.sleep(random.uniform(0, self._jitter))
+        while True:
+            if await self.refresh_all():
+                self._failures = 0
+            else:
+                self._failures += 1
+            delay = self.next_delay()
+            logging.debug("Next prefetch in %.1f seconds", delay)
+            await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            if PREFETCH_LEADER_FILE:
+                self._leader_lock = try_hold_file_lock(Path(PREFETCH_LEADER_FILE))
+                if self._leader_lock is None:
+                    logging.info("Another worker is running the background prefetch")
+                    return
+            self._task = asyncio.create_task(self.run())
+            logging.info("Started background prefetch every %s seconds", self._interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._leader_lock is not None:
+            self._leader_lock.close()
+            self._leader_lock = None
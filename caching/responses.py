@@ -0,0 +1,307 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+
+from pydantic import BaseModel, Field, ValidationError
+
+from caching.compression import CONTENT_ENCODINGS, compress_variants
+from custom_i18n.langs import Languages
+
+CALENDAR_CACHE_TTL_SECONDS: float = float(
+    os.getenv("CALENDAR_CACHE_TTL_SECONDS", "300"),
+)
+CALENDAR_CACHE_MAX_ENTRIES: int = int(os.getenv("CALENDAR_CACHE_MAX_ENTRIES", "256"))
+CALENDAR_CACHE_MAX_STALENESS_SECONDS: float = float(
+    os.getenv("CALENDAR_CACHE_MAX_STALENESS_SECONDS", "86400"),
+)
+CALENDAR_CACHE_DIR: str = os.getenv("CALENDAR_CACHE_DIR", "")
+
+CacheKey = tuple[str, str, Languages, str]
+
+
+def compute_etag(content: str) -> str:
+    return f'"{hashlib.blake2b(content.encode(), digest_size=16).hexdigest()}"'
+
+
+def strip_encoding_suffix(etag: str) -> str:
+    for encoding in CONTENT_ENCODINGS:
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return f'{etag.removesuffix(suffix)}"'
+    return etag
+
+
+class CachedCalendar(BaseModel):
+    content: str
+    etag: str
+    last_modified: datetime
+    stored_at: float
+    variants: dict[str, bytes] = Field(default_factory=dict, exclude=True)
+
+    @classmethod
+    def build(
+        cls,
+        content: str,
+        previous: "CachedCalendar | None" = None,
+    ) -> "CachedCalendar":
+        etag = compute_etag(content)
+        unchanged = previous is not None and previous.etag == etag
+        return cls(
+            content=content,
+            etag=etag,
+            last_modified=previous.last_modified
+            if unchanged
+            else datetime.now(tz=timezone.utc).replace(microsecond=0),
+            stored_at=time.time(),
+            variants=previous.variants
+            if unchanged and previous.variants
+            else compress_variants(content.encode()),
+        )
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def variant_etag(self, encoding: str | None) -> str:
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
+
+    def body(self, encoding: str | None) -> str | bytes:
+        if encoding is None:
+            return self.content
+        return self.variants[encoding]
+
+    def headers(self, ttl: float, encoding: str | None = None) -> dict[str, str]:
+        headers = {
+            "ETag": self.variant_etag(encoding),
+            "Last-Modified": format_datetime(
+                self.last_modified.astimezone(timezone.utc),
+                usegmt=True,
+            ),
+            "Cache-Control": f"private, max-age={int(ttl)}",
+            "Vary": "Accept-Encoding",
+        }
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return headers
+
+    def not_modified(
+        self,
+        if_none_match: str | None,
+        if_modified_since: str | None,
+    ) -> bool:
+        if if_none_match is not None:
+            candidates = {
+                strip_encoding_suffix(tag.strip().removeprefix("W/"))
+                for tag in if_none_match.split(",")
+            }
+            return "*" in candidates or self.etag in candidates
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+            return self.last_modified <= since
+        return False
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: float = CALENDAR_CACHE_TTL_SECONDS,
+        max_entries: int = CALENDAR_CACHE_MAX_ENTRIES,
+        max_staleness: float = CALENDAR_CACHE_MAX_STALENESS_SECONDS,
+    ) -> None:
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self._max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, CachedCalendar] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: CacheKey,
+        encoding: str | None = None,
+    ) -> CachedCalendar | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.is_fresh(self.ttl):
+                logging.debug("Response cache miss for %s", key)
+                return None
+            self._entries.move_to_end(key)
+            logging.debug("Response cache hit for %s", key)
+            return entry
+
+    def get_stale(
+        self,
+        key: CacheKey,
+        encoding: str | None = None,
+    ) -> CachedCalendar | None:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or not entry.is_fresh(self.ttl + self.max_staleness):
+            return None
+        return entry
+
+    def put(self, key: CacheKey, content: str) -> CachedCalendar:
+        with self._lock:
+            previous = self._entries.get(key)
+        entry = CachedCalendar.build(content, previous)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                logging.debug("Evicted %s from response cache", evicted)
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskResponseCache:
+    def __init__(
+        self,
+        directory: Path,
+        ttl: float = CALENDAR_CACHE_TTL_SECONDS,
+        max_entries: int = CALENDAR_CACHE_MAX_ENTRIES,
+        max_staleness: float = CALENDAR_CACHE_MAX_STALENESS_SECONDS,
+    ) -> None:
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self._directory = directory
+        self._max_entries = max_entries
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: CacheKey) -> Path:
+        start_date, end_date, language, lesson_filter = key
+        digest = hashlib.blake2b(
+            f"{start_date}|{end_date}|{language.value}|{lesson_filter}".encode(),
+            digest_size=16,
+        ).hexdigest()
+        return self._directory / f"{digest}.json"
+
+    def _variant_path(self, path: Path, etag: str, encoding: str) -> Path:
+        return path.with_name(f"{path.stem}-{etag[1:-1]}.{encoding}")
+
+    def _variant_paths(self, path: Path) -> list[Path]:
+        return [
+            variant
+            for encoding in CONTENT_ENCODINGS
+            for pattern in (f"{path.stem}-*.{encoding}", f"{path.stem}.{encoding}")
+            for variant in self._directory.glob(pattern)
+        ]
+
+    def _read(self, path: Path, encoding: str | None = None) -> CachedCalendar | None:
+        try:
+            entry = CachedCalendar.model_validate_json(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except ValidationError:
+            logging.warning("Ignoring corrupt response cache entry %s", path)
+            return None
+        if encoding is not None:
+            try:
+                entry.variants[encoding] = self._variant_path(
+                    path,
+                    entry.etag,
+                    encoding,
+                ).read_bytes()
+            except FileNotFoundError:
+                pass
+        return entry
+
+    def _write(self, path: Path, content: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._directory,
+            prefix=f".{path.name}.",
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def _remove(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        for variant in self._variant_paths(path):
+            variant.unlink(missing_ok=True)
+
+    def _entries_by_age(self) -> list[Path]:
+        entries: list[tuple[float, Path]] = []
+        for path in self._directory.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        entries.sort()
+        return [path for _, path in entries]
+
+    def get(
+        self,
+        key: CacheKey,
+        encoding: str | None = None,
+    ) -> CachedCalendar | None:
+        path = self._path(key)
+        entry = self._read(path, encoding)
+        if entry is None or not entry.is_fresh(self.ttl):
+            logging.debug("Disk response cache miss for %s", key)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        logging.debug("Disk response cache hit for %s", key)
+        return entry
+
+    def get_stale(
+        self,
+        key: CacheKey,
+        encoding: str | None = None,
+    ) -> CachedCalendar | None:
+        entry = self._read(self._path(key), encoding)
+        if entry is None or not entry.is_fresh(self.ttl + self.max_staleness):
+            return None
+        return entry
+
+    def put(self, key: CacheKey, content: str) -> CachedCalendar:
+        path = self._path(key)
+        entry = CachedCalendar.build(content, self._read(path))
+        current = {
+            self._variant_path(path, entry.etag, encoding): variant
+            for encoding, variant in entry.variants.items()
+        }
+        for variant_path, variant in current.items():
+            self._write(variant_path, variant)
+        self._write(path, entry.model_dump_json().encode())
+        for variant_path in self._variant_paths(path):
+            if variant_path not in current:
+                variant_path.unlink(missing_ok=True)
+        entries = self._entries_by_age()
+        for evicted in entries[: max(0, len(entries) - self._max_entries)]:
+            self._remove(evicted)
+            logging.debug("Evicted %s from disk response cache", evicted)
+        return entry
+
+    def clear(self) -> None:
+        for path in self._directory.glob("*.json"):
+            self._remove(path)
+
+
+def create_response_cache(account: str) -> ResponseCache | DiskResponseCache:
+    if CALENDAR_CACHE_DIR:
+        return DiskResponseCache(Path(CALENDAR_CACHE_DIR) / account)
+    return ResponseCache()
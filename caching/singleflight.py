@@ -0,0 +1,28 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncSingleFlight(Generic[T]):
+    def __init__(self) -> None:
+        self._in_flight: dict[Hashable, asyncio.Task[T]] = {}
+
+    def _forget(self, key: Hashable, task: asyncio.Task[T]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logging.debug("Joining in-flight call for %s", key)
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
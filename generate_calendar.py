@@ -1,56 +1,681 @@
+import argparse
+import asyncio
+import hashlib
+import json
 import logging
-from datetime import datetime
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
 
+from pydantic import BaseModel
+
+from authenticate.breaker import CircuitBreaker
+from authenticate.http import export_connection_stats
 from authenticate.id_itmo_ru import ITMOAuthenticator
+from authenticate.registry import DEFAULT_ACCOUNT, get_registry
+from caching.day_store import DayStore, decode_payloads, get_day_store
+from caching.responses import CALENDAR_CACHE_MAX_ENTRIES, CALENDAR_CACHE_TTL_SECONDS
+from caching.singleflight import AsyncSingleFlight
 from custom_i18n.langs import Languages
-from ics_calendar.cal import create_calendar
-from schedule.models import Lesson, Schedule
+from ics_calendar.cal import (
+    ICS_SERIALIZER,
+    CalendarSerializers,
+    EventState,
+    IncrementalCalendar,
+    RenderedEvent,
+    advance_event_states,
+    create_calendar,
+    event_hash,
+    event_uid,
+    format_utc,
+)
+from metrics.pipeline import record_cache, set_pipeline_labels, stage
+from schedule.index import LessonFilter, LessonIndex
+from schedule.models import LessonRecord, RawDay, RawSchedule
+
+SCHEDULE_API_BASE_URL: str = os.getenv(
+    "SCHEDULE_API_BASE_URL",
+    "https://api.schedule.itmo.su",
+).rstrip("/")
+SCHEDULE_API_URL_PERSONAL: str = f"{SCHEDULE_API_BASE_URL}/api/v3/schedule/personal"
+SCHEDULE_API_TIMEOUT_SECONDS: int = int(os.getenv("SCHEDULE_API_TIMEOUT_SECONDS", "20"))
+STREAMING_MIN_DAYS: int = int(os.getenv("STREAMING_MIN_DAYS", "0"))
+LESSON_INDEX_TTL_SECONDS: float = float(
+    os.getenv("LESSON_INDEX_TTL_SECONDS", f"{CALENDAR_CACHE_TTL_SECONDS}"),
+)
+LESSON_INDEX_MAX_RENDERINGS: int = int(os.getenv("LESSON_INDEX_MAX_RENDERINGS", "32"))
+
+SCHEDULE_BREAKER: CircuitBreaker = CircuitBreaker("schedule")
+
+
+class UpstreamSnapshot(NamedTuple):
+    fingerprint: str
+    etag: str | None
+    last_modified: str | None
+    days: tuple[RawDay, ...]
+    changed: bool = True
+
+
+_SCHEDULE_FETCHES: AsyncSingleFlight[tuple[str, list[LessonRecord] | None]] = (
+    AsyncSingleFlight()
+)
+_UPSTREAM_FETCHES: AsyncSingleFlight[UpstreamSnapshot] = AsyncSingleFlight()
+_STORE_REFRESHES: AsyncSingleFlight[None] = AsyncSingleFlight()
+_UPSTREAM_SNAPSHOTS: OrderedDict[
+    tuple[str, date, date, Languages],
+    UpstreamSnapshot,
+] = OrderedDict()
+_UPSTREAM_SNAPSHOTS_LOCK = threading.Lock()
+_RENDERED_EVENTS: OrderedDict[
+    tuple[str, date, date, Languages],
+    dict[str, RenderedEvent],
+] = OrderedDict()
+_RENDERED_EVENTS_LOCK = threading.Lock()
+_LESSON_INDEXES: OrderedDict[tuple[str, date, date, Languages], LessonIndex] = (
+    OrderedDict()
+)
+_LESSON_INDEXES_LOCK = threading.Lock()
+
+
+def get_authenticator(account: str = DEFAULT_ACCOUNT) -> ITMOAuthenticator:
+    return get_registry().authenticator(account)
+
+
+def format_date(value: datetime | str) -> str:
+    return value.strftime("%Y-%m-%d") if isinstance(value, datetime) else value
+
+
+def parse_date(value: datetime | str) -> date:
+    return date.fromisoformat(format_date(value))
+
+
+def schedule_params(
+    start_date: datetime | str,
+    end_date: datetime | str,
+) -> dict[str, str]:
+    return {
+        "date_start": format_date(start_date),
+        "date_end": format_date(end_date),
+    }
+
+
+def parse_days(days: Iterable[RawDay]) -> list[LessonRecord]:
+    lessons: list[LessonRecord] = []
+    with stage("record_build"):
+        for day in days:
+            lessons.extend(day.to_records())
+    logging.info("Got %d lessons from schedule", len(lessons))
+    return lessons
+
+
+def iter_day_lessons(days: Iterable[RawDay]) -> Iterator[list[LessonRecord]]:
+    for day in days:
+        yield day.to_records()
+
+
+def iter_payload_lessons(payloads: list[str]) -> Iterator[list[LessonRecord]]:
+    payloads.reverse()
+    while payloads:
+        yield RawDay.model_validate_json(payloads.pop()).to_records()
+
+
+def fingerprint(parts: Iterable[bytes]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def conditional_headers(snapshot: UpstreamSnapshot | None) -> dict[str, str]:
+    if snapshot is None:
+        return {}
+    headers = {}
+    if snapshot.etag is not None:
+        headers["If-None-Match"] = snapshot.etag
+    if snapshot.last_modified is not None:
+        headers["If-Modified-Since"] = snapshot.last_modified
+    return headers
+
+
+def decode_schedule(schedule_response_content: bytes) -> list[RawDay]:
+    with stage("decode_validate"):
+        return RawSchedule.model_validate_json(schedule_response_content).data
+
+
+def parse_schedule(schedule_response_content: bytes) -> list[LessonRecord]:
+    return parse_days(decode_schedule(schedule_response_content))
+
+
+def render_lessons(lessons: list[LessonRecord], language: Languages) -> str:
+    with stage("event_construction"):
+        calendar = create_calendar(language=language, lessons=lessons)
+    logging.info("Created calendar with %d events", len(lessons))
+    with stage("serialization"):
+        return calendar.serialize()
+
+
+def log_connection_stats() -> None:
+    stats = export_connection_stats()
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Upstream connection pool: %s", stats)
+
+
+def event_states(
+    key: tuple[str, date, date, Languages],
+    lessons: list[LessonRecord],
+    previous: dict[str, RenderedEvent] | None,
+    now: str,
+) -> dict[str, EventState]:
+    hashes = {event_uid(lesson): event_hash(lesson) for lesson in lessons}
+    store = get_day_store()
+    if store is None:
+        return advance_event_states(
+            {uid: event.state for uid, event in (previous or {}).items()},
+            hashes,
+            now,
+        )
+    return store.reconcile_events(key[0], key[3], hashes, now)
+
+
+def remember_rendered_events(
+    key: tuple[str, date, date, Languages],
+    rendered: dict[str, RenderedEvent],
+) -> None:
+    with _RENDERED_EVENTS_LOCK:
+        _RENDERED_EVENTS[key] = rendered
+        _RENDERED_EVENTS.move_to_end(key)
+        while len(_RENDERED_EVENTS) > CALENDAR_CACHE_MAX_ENTRIES:
+            _RENDERED_EVENTS.popitem(last=False)
+
+
+def log_rendered_events(
+    key: tuple[str, date, date, Languages],
+    calendar: IncrementalCalendar,
+) -> None:
+    total = len(calendar.rendered)
+    record_cache("rendered_events", hit=True, amount=total - calendar.changed)
+    record_cache("rendered_events", hit=False, amount=calendar.changed)
+    logging.info("Re-rendered %d of %d events for %s", calendar.changed, total, key)
+
+
+def render_lessons_incremental(
+    key: tuple[str, date, date, Languages],
+    lessons: list[LessonRecord],
+    remember: bool = True,
+) -> str:
+    language = key[3]
+    if ICS_SERIALIZER is not CalendarSerializers.FAST:
+        return render_lessons(lessons, language)
+    with _RENDERED_EVENTS_LOCK:
+        previous = _RENDERED_EVENTS.get(key)
+    now = format_utc(datetime.now(tz=timezone.utc))
+    states = event_states(key, lessons, previous, now)
+    calendar = IncrementalCalendar(language, states, previous)
+    with stage("event_construction"):
+        for lesson in lessons:
+            calendar.add_event(lesson)
+    log_rendered_events(key, calendar)
+    if remember:
+        remember_rendered_events(key, calendar.rendered)
+    with stage("serialization"):
+        return calendar.serialize()
+
+
+def stream_lessons_incremental(
+    key: tuple[str, date, date, Languages],
+    lessons_by_day: Iterable[list[LessonRecord]],
+) -> Iterator[str]:
+    with _RENDERED_EVENTS_LOCK:
+        previous = _RENDERED_EVENTS.get(key)
+    now = format_utc(datetime.now(tz=timezone.utc))
+    calendar = IncrementalCalendar(key[3], {}, previous)
+    yield from calendar.stream_reconciled(
+        lessons_by_day,
+        lambda lessons: event_states(key, lessons, previous, now),
+    )
+    log_rendered_events(key, calendar)
+    remember_rendered_events(key, calendar.rendered)
 
 
 def main(
     start_date: datetime | str,
     end_date: datetime | str,
     language: Languages = Languages.ENGLISH,
+    account: str = DEFAULT_ACCOUNT,
 ) -> str:
-    authenticator = ITMOAuthenticator(
-        client_id="profile",
-        client_secret=None,
-    )
-    logging.info("Initialized %s authenticator", authenticator)
+    set_pipeline_labels(language.value, parse_date(start_date), parse_date(end_date))
+    authenticator = get_authenticator(account)
     if not authenticator.token_exists_and_is_valid():
         msg = "Token does not exist or is invalid"
         logging.error(msg)
         raise RuntimeError(msg)
-    authenticator.refresh()
-    schedule_response = authenticator.request(
-        method="GET",
-        url="https://api.schedule.itmo.su/api/v3/schedule/personal",
-        language=language.value.__str__().lower(),
-        params={
-            "date_start": start_date.strftime("%Y-%m-%d")
-            if isinstance(start_date, datetime)
-            else start_date,
-            "date_end": end_date.strftime("%Y-%m-%d")
-            if isinstance(end_date, datetime)
-            else end_date,
-        },
+    with SCHEDULE_BREAKER.guard(), stage("upstream_http"):
+        schedule_response = authenticator.request(
+            method="GET",
+            url=SCHEDULE_API_URL_PERSONAL,
+            timeout=SCHEDULE_API_TIMEOUT_SECONDS,
+            language=language.value.__str__().lower(),
+            params=schedule_params(start_date, end_date),
+        )
+        if schedule_response.status_code >= 500:
+            schedule_response.raise_for_status()
+    schedule_response.raise_for_status()
+    logging.info("Got schedule response: %s", schedule_response)
+    log_connection_stats()
+    return render_lessons(parse_schedule(schedule_response.content), language)
+
+
+async def afetch_days(
+    start_date: date,
+    end_date: date,
+    language: Languages,
+    account: str = DEFAULT_ACCOUNT,
+) -> UpstreamSnapshot:
+    return await _UPSTREAM_FETCHES.do(
+        (account, start_date, end_date, language),
+        lambda: afetch_snapshot(start_date, end_date, language, account),
     )
+
+
+async def afetch_snapshot(
+    start_date: date,
+    end_date: date,
+    language: Languages,
+    account: str = DEFAULT_ACCOUNT,
+) -> UpstreamSnapshot:
+    authenticator = get_authenticator(account)
+    if not await authenticator.atoken_exists_and_is_valid():
+        msg = "Token does not exist or is invalid"
+        logging.error(msg)
+        raise RuntimeError(msg)
+    key = (account, start_date, end_date, language)
+    with _UPSTREAM_SNAPSHOTS_LOCK:
+        previous = _UPSTREAM_SNAPSHOTS.get(key)
+    with SCHEDULE_BREAKER.guard(), stage("upstream_http"):
+        schedule_response = await authenticator.arequest(
+            method="GET",
+            url=SCHEDULE_API_URL_PERSONAL,
+            timeout=SCHEDULE_API_TIMEOUT_SECONDS,
+            language=language.value.__str__().lower(),
+            headers=conditional_headers(previous),
+            params=schedule_params(start_date.isoformat(), end_date.isoformat()),
+        )
+        if schedule_response.status_code >= 500:
+            schedule_response.raise_for_status()
     logging.info("Got schedule response: %s", schedule_response)
-    schedule_response_json = schedule_response.json()
-    logging.debug("Got schedule response JSON: %s", schedule_response_json)
-    for day in schedule_response_json["data"]:
-        for lesson in day["lessons"]:
-            lesson["date"] = day["date"]
-    schedule = Schedule(**schedule_response_json)
-    lessons: list[Lesson] = []
-    for day in schedule.data:
-        for lesson in day.lessons:
-            lessons.append(lesson)
-    logging.info("Got %d lessons from schedule", len(lessons))
-    calendar = create_calendar(language=language, lessons=lessons)
-    logging.info("Created calendar: %s", calendar)
-    return calendar.serialize()
+    log_connection_stats()
+    if previous is not None and schedule_response.status_code == 304:
+        record_cache("upstream_payload", hit=True)
+        return previous._replace(changed=False)
+    schedule_response.raise_for_status()
+    content_fingerprint = fingerprint([schedule_response.content])
+    etag = schedule_response.headers.get("ETag")
+    last_modified = schedule_response.headers.get("Last-Modified")
+    if previous is not None and previous.fingerprint == content_fingerprint:
+        record_cache("upstream_payload", hit=True)
+        logging.info("Schedule payload for %s is unchanged", key)
+        snapshot = previous._replace(
+            etag=etag,
+            last_modified=last_modified,
+            changed=False,
+        )
+    else:
+        record_cache("upstream_payload", hit=False)
+        snapshot = UpstreamSnapshot(
+            fingerprint=content_fingerprint,
+            etag=etag,
+            last_modified=last_modified,
+            days=tuple(
+                await asyncio.to_thread(decode_schedule, schedule_response.content),
+            ),
+        )
+    remembered = snapshot._replace(changed=True)
+    if get_day_store() is not None:
+        remembered = remembered._replace(days=())
+    with _UPSTREAM_SNAPSHOTS_LOCK:
+        _UPSTREAM_SNAPSHOTS[key] = remembered
+        _UPSTREAM_SNAPSHOTS.move_to_end(key)
+        while len(_UPSTREAM_SNAPSHOTS) > CALENDAR_CACHE_MAX_ENTRIES:
+            _UPSTREAM_SNAPSHOTS.popitem(last=False)
+    return snapshot
+
+
+async def arefresh_store(
+    store: DayStore,
+    start_date: date,
+    end_date: date,
+    language: Languages,
+    account: str = DEFAULT_ACCOUNT,
+) -> None:
+    await _STORE_REFRESHES.do(
+        (account, start_date, end_date, language),
+        lambda: arefresh_missing(store, start_date, end_date, language, account),
+    )
+
+
+async def arefresh_missing(
+    store: DayStore,
+    start_date: date,
+    end_date: date,
+    language: Languages,
+    account: str = DEFAULT_ACCOUNT,
+) -> None:
+    missing = await asyncio.to_thread(
+        store.missing_ranges,
+        account,
+        start_date,
+        end_date,
+        language,
+    )
+    record_cache("day_store", hit=not missing)
+    logging.info(
+        "Fetching %d missing or stale ranges for %s - %s",
+        len(missing),
+        start_date,
+        end_date,
+    )
+    fetched = await asyncio.gather(
+        *(
+            afetch_days(missing_start, missing_end, language, account)
+            for missing_start, missing_end in missing
+        ),
+    )
+    for (missing_start, missing_end), snapshot in zip(missing, fetched):
+        if not snapshot.changed:
+            touched = await asyncio.to_thread(
+                store.touch,
+                account,
+                missing_start,
+                missing_end,
+                language,
+            )
+            if touched > (missing_end - missing_start).days:
+                continue
+            logging.info(
+                "Day store lost unchanged days %s - %s, fetching them again",
+                missing_start,
+                missing_end,
+            )
+            with _UPSTREAM_SNAPSHOTS_LOCK:
+                _UPSTREAM_SNAPSHOTS.pop(
+                    (account, missing_start, missing_end, language),
+                    None,
+                )
+            snapshot = await afetch_days(missing_start, missing_end, language, account)
+        await asyncio.to_thread(
+            store.store,
+            account,
+            missing_start,
+            missing_end,
+            language,
+            snapshot.days,
+        )
+
+
+async def aload_days(
+    start_date: date,
+    end_date: date,
+    language: Languages,
+    account: str = DEFAULT_ACCOUNT,
+) -> list[RawDay]:
+    store = get_day_store()
+    if store is None:
+        return list((await afetch_days(start_date, end_date, language, account)).days)
+    await arefresh_store(store, start_date, end_date, language, account)
+    return await asyncio.to_thread(
+        store.load,
+        account,
+        start_date,
+        end_date,
+        language,
+    )
+
+
+async def aload_lessons(
+    start_date: date,
+    end_date: date,
+    language: Languages,
+    account: str = DEFAULT_ACCOUNT,
+    previous_source: str | None = None,
+) -> tuple[str, list[LessonRecord] | None]:
+    store = get_day_store()
+    if store is None:
+        snapshot = await afetch_days(start_date, end_date, language, account)
+        source, days = snapshot.fingerprint, snapshot.days
+    else:
+        await arefresh_store(store, start_date, end_date, language, account)
+        payloads = await asyncio.to_thread(
+            store.load_payloads,
+            account,
+            start_date,
+            end_date,
+            language,
+        )
+        source, days = fingerprint([payload.encode() for payload in payloads]), None
+    if source == previous_source:
+        return source, None
+    if days is None:
+        days = await asyncio.to_thread(decode_payloads, payloads)
+    return source, await asyncio.to_thread(parse_days, days)
+
+
+async def aload_index(
+    key: tuple[str, date, date, Languages],
+) -> LessonIndex:
+    with _LESSON_INDEXES_LOCK:
+        index = _LESSON_INDEXES.get(key)
+    if index is not None and index.is_fresh(LESSON_INDEX_TTL_SECONDS):
+        record_cache("lesson_index", hit=True)
+        return index
+    record_cache("lesson_index", hit=False)
+    account, start, end, language = key
+    previous = index
+    source, lessons = await _SCHEDULE_FETCHES.do(
+        key,
+        lambda: aload_lessons(
+            start,
+            end,
+            language,
+            account,
+            previous.source if previous is not None else None,
+        ),
+    )
+    if lessons is None and previous is not None and previous.source == source:
+        logging.info("Schedule for %s is unchanged, reusing its lesson index", key)
+        previous.touch()
+        return previous
+    if lessons is None:
+        source, lessons = await aload_lessons(start, end, language, account)
+    index = await asyncio.to_thread(LessonIndex, lessons, source)
+    with _LESSON_INDEXES_LOCK:
+        _LESSON_INDEXES[key] = index
+        _LESSON_INDEXES.move_to_end(key)
+        while len(_LESSON_INDEXES) > CALENDAR_CACHE_MAX_ENTRIES:
+            _LESSON_INDEXES.popitem(last=False)
+    return index
+
+
+async def amain(
+    start_date: datetime | str,
+    end_date: datetime | str,
+    language: Languages = Languages.ENGLISH,
+    account: str = DEFAULT_ACCOUNT,
+    lesson_filter: LessonFilter | None = None,
+) -> str:
+    start, end = parse_date(start_date), parse_date(end_date)
+    set_pipeline_labels(language.value, start, end)
+    key = (account, start, end, language)
+    index = await aload_index(key)
+    unfiltered = lesson_filter is None or lesson_filter.is_empty()
+    filter_key = "" if unfiltered else lesson_filter.cache_key()
+    content = index.rendered.get(filter_key)
+    record_cache("rendered_output", hit=content is not None)
+    if content is not None:
+        return content
+    if unfiltered:
+        content = await asyncio.to_thread(
+            render_lessons_incremental,
+            key,
+            index.lessons,
+        )
+    else:
+        lessons = index.select(lesson_filter)
+        logging.info(
+            "Selected %d of %d lessons for %s",
+            len(lessons),
+            len(index.lessons),
+            filter_key,
+        )
+        content = await asyncio.to_thread(
+            render_lessons_incremental,
+            key,
+            lessons,
+            False,
+        )
+    index.remember(filter_key, content, LESSON_INDEX_MAX_RENDERINGS)
+    return content
+
+
+def should_stream(start_date: datetime | str, end_date: datetime | str) -> bool:
+    return (
+        STREAMING_MIN_DAYS > 0
+        and (parse_date(end_date) - parse_date(start_date)).days + 1
+        >= STREAMING_MIN_DAYS
+    )
+
+
+async def astream(
+    start_date: datetime | str,
+    end_date: datetime | str,
+    language: Languages = Languages.ENGLISH,
+    account: str = DEFAULT_ACCOUNT,
+) -> Iterator[str]:
+    start, end = parse_date(start_date), parse_date(end_date)
+    set_pipeline_labels(language.value, start, end)
+    key = (account, start, end, language)
+    store = get_day_store()
+    if store is None:
+        days = await aload_days(start, end, language, account)
+        logging.info("Streaming calendar for %d days", len(days))
+        return stream_lessons_incremental(key, iter_day_lessons(days))
+    await arefresh_store(store, start, end, language, account)
+    payloads = await asyncio.to_thread(
+        store.load_payloads,
+        account,
+        start,
+        end,
+        language,
+    )
+    logging.info("Streaming calendar for %d stored days", len(payloads))
+    return stream_lessons_incremental(key, iter_payload_lessons(payloads))
+
+
+class BatchJob(BaseModel):
+    start_date: date
+    end_date: date
+    language: Languages = Languages.ENGLISH
+    account: str = DEFAULT_ACCOUNT
+
+    def output_path(self, output_dir: Path) -> Path:
+        return output_dir.joinpath(
+            self.account,
+            self.start_date.isoformat(),
+            self.end_date.isoformat(),
+            self.language.value,
+            "schedule.ics",
+        )
+
+
+def render_to_file(days: list[RawDay], language: Languages, path: Path) -> int:
+    lessons = parse_days(days)
+    create_calendar(
+        language=language,
+        lessons=lessons,
+        serializer=CalendarSerializers.FAST,
+    ).write_to_file(path)
+    return len(lessons)
+
+
+async def abatch(
+    jobs: list[BatchJob],
+    output_dir: Path,
+    workers: int,
+    processes: int,
+) -> int:
+    semaphore = asyncio.Semaphore(workers)
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+
+        async def run(job: BatchJob) -> None:
+            async with semaphore:
+                days = await aload_days(
+                    job.start_date,
+                    job.end_date,
+                    job.language,
+                    job.account,
+                )
+            path = job.output_path(output_dir)
+            lessons = await loop.run_in_executor(
+                pool,
+                render_to_file,
+                days,
+                job.language,
+                path,
+            )
+            logging.info("Wrote %d lessons to %s", lessons, path)
+
+        results = await asyncio.gather(
+            *(run(job) for job in jobs),
+            return_exceptions=True,
+        )
+    failed = 0
+    for job, result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            failed += 1
+            logging.error("Failed to render %s: %s", job, result)
+    logging.info("Rendered %d of %d calendars", len(jobs) - failed, len(jobs))
+    return failed
+
+
+def cli() -> int:
+    parser = argparse.ArgumentParser(description="Render ITMO schedules to iCalendar")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    render_parser = subparsers.add_parser("render", help="render one calendar")
+    render_parser.add_argument("start_date")
+    render_parser.add_argument("end_date")
+    render_parser.add_argument("--language", type=Languages, default=Languages.ENGLISH)
+    render_parser.add_argument("--account", default=DEFAULT_ACCOUNT)
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="pre-render many calendars to "
+        "OUTPUT_DIR/<account>/<start>/<end>/<language>/schedule.ics",
+    )
+    batch_parser.add_argument(
+        "jobs",
+        type=Path,
+        help="JSON list of {start_date, end_date, language, account} objects",
+    )
+    batch_parser.add_argument("--output-dir", type=Path, required=True)
+    batch_parser.add_argument("--workers", type=int, default=8)
+    batch_parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    if args.command == "render":
+        sys.stdout.write(
+            main(args.start_date, args.end_date, args.language, args.account),
+        )
+        return 0
+    with args.jobs.open() as f:
+        jobs = [BatchJob(**job) for job in json.load(f)]
+    failed = asyncio.run(abatch(jobs, args.output_dir, args.workers, args.processes))
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    main("2023-09-07", "2023-09-10")
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(cli())
@@ -1,7 +1,14 @@
+import hashlib
 import logging
-from datetime import date, datetime, timedelta
+import os
+import tempfile
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date, datetime, timedelta, timezone
 from datetime import time as d_time
+from enum import StrEnum
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
 
 import ics
 
@@ -13,12 +20,30 @@ from custom_i18n.schd import (
     NOTES_TR,
     NotesOfNotes,
 )
-from schedule.models import Lesson
+from schedule.models import Buildings, LessonRecord, LessonTypes
 
 
-def get_week_range_datetimes() -> tuple[datetime, datetime]:
+class CalendarSerializers(StrEnum):
+    ICS = "ics"
+    FAST = "fast"
+
+
+ICS_SERIALIZER: CalendarSerializers = CalendarSerializers(
+    os.getenv("ICS_SERIALIZER", CalendarSerializers.FAST),
+)
+ICS_PRODID: str = "ics.py - http://git.io/lLljaA"
+ICS_LINE_LIMIT_OCTETS: int = 75
+ICS_CALENDAR_HEADER: str = (
+    f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:{ICS_PRODID}\r\n"
+)
+ICS_CALENDAR_FOOTER: str = "END:VCALENDAR\r\n"
+
+
+def get_week_range_datetimes(weeks_ahead: int = 0) -> tuple[datetime, datetime]:
     today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())
+    start_of_week = today - timedelta(days=today.weekday()) + timedelta(
+        weeks=weeks_ahead,
+    )
     end_of_week = start_of_week + timedelta(days=6)
     logging.debug("Calculated week range: %s - %s", start_of_week, end_of_week)
     return datetime.combine(start_of_week, d_time.min), datetime.combine(
@@ -31,22 +56,17 @@ class Calendar:
     def __init__(self, language: Languages) -> None:
         self._calendar = ics.Calendar()
         self.language = language
+        self.context = RENDER_CONTEXTS[language]
 
-    def add_event(self, lesson: Lesson) -> None:
+    def add_event(self, lesson: LessonRecord) -> None:
         self._calendar.events.add(
             ics.Event(
-                name=camelcase_title(
-                    f"{lesson.subject} ({LESSON_TYPES_TR[self.language][lesson.work_type_id][1]})",
-                )
-                if self.language is Languages.ENGLISH
-                else f"{lesson.subject} ({LESSON_TYPES_TR[self.language][lesson.work_type_id][1]})",
+                name=self.event_name(lesson),
                 begin=lesson.time_start,
                 end=lesson.time_end,
                 uid=lesson.pair_id.__str__(),
                 description=self.generate_description(lesson),
-                location=f"{AUDITORIUMS_TR[self.language][0][1].title()} {lesson.room}; {BUILDINGS_TR[self.language][lesson.bld_id][0] if lesson.bld_id else ''}"
-                if lesson.room is not None or lesson.bld_id is not None
-                else None,
+                location=self.event_location(lesson),
                 organizer=ics.Organizer(
                     email=f"{lesson.teacher_id}",
                     common_name=f"{lesson.teacher_name or 'Unknown'}",
@@ -57,18 +77,38 @@ class Calendar:
                 last_modified=datetime.now(tz=lesson.time_start.tzinfo),
             ),
         )
-        logging.debug(f"Added event to calendar: {lesson}")
+        logging.debug("Added event to calendar: %s", lesson.pair_id)
+
+    def event_name(self, lesson: LessonRecord) -> str:
+        return event_title(self.language, lesson.subject, lesson.work_type_id)
+
+    def event_location(self, lesson: LessonRecord) -> str | None:
+        if lesson.room is None and lesson.bld_id is None:
+            return None
+        return f"{self.context.location_prefix}{lesson.room}; {self.context.building_names[lesson.bld_id] if lesson.bld_id else ''}"
 
     def serialize(self) -> str:
         logging.debug("Serializing calendar")
         return self._calendar.serialize()
 
-    def write_to_file(self, filename: Path):
-        logging.debug(f"Writing calendar to file: {filename}")
-        with filename.open(mode="w") as f:
-            f.writelines(self.serialize())
+    def write_to_file(self, filename: Path, mode: int = 0o644):
+        logging.debug("Writing calendar to file: %s", filename)
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=filename.parent,
+            prefix=f".{filename.name}.",
+            suffix=".tmp",
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(self.serialize())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, filename)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
 
-    def generate_description(self, lesson: Lesson) -> str:
+    def generate_description(self, lesson: LessonRecord) -> str:
         output_string: str = ""
         output_string += self.add_note_to_output_string(
             lesson.note,
@@ -92,8 +132,8 @@ class Calendar:
         )
         logging.debug(
             "Generated description for lesson %s that is %d chars long",
-            lesson,
-            output_string.__len__(),
+            lesson.pair_id,
+            len(output_string),
         )
         return output_string.strip()
 
@@ -103,12 +143,187 @@ class Calendar:
         note_type: NotesOfNotes,
     ) -> str:
         if note is not None:
-            return f"{camelcase_title(NOTES_TR[self.language][note_type], self.language)}: {note}\n"
+            return f"{self.context.note_labels[note_type]}{note}\n"
         return ""
 
 
-def camelcase_title(title: str, language: Languages = Languages.ENGLISH) -> str:
-    EXCEPTIONS: set[str] = {
+class FastCalendar(Calendar):
+    def __init__(self, language: Languages) -> None:
+        self.language = language
+        self.context = RENDER_CONTEXTS[language]
+        self._events: list[str] = []
+        self._last_modified = format_utc(datetime.now(tz=timezone.utc))
+
+    def add_event(self, lesson: LessonRecord) -> None:
+        self._events.append(self.render_event(lesson))
+
+    def render_event(
+        self,
+        lesson: LessonRecord,
+        sequence: int | None = None,
+        last_modified: str | None = None,
+    ) -> str:
+        lines = [
+            "BEGIN:VEVENT",
+            f"CATEGORIES:{escape_text(lesson.group.strip())}",
+        ]
+        description = self.generate_description(lesson)
+        if description:
+            lines.append(f"DESCRIPTION:{escape_text(description)}")
+        lines.append(f"DTEND:{format_utc(lesson.time_end)}")
+        lines.append(f"LAST-MODIFIED:{last_modified or self._last_modified}")
+        location = self.event_location(lesson)
+        if location:
+            lines.append(f"LOCATION:{escape_text(location)}")
+        lines.append(
+            f"ORGANIZER;CN={escape_text(lesson.teacher_name or 'Unknown')}:"
+            f"{escape_text(f'mailto:{lesson.teacher_id}')}",
+        )
+        if sequence is not None:
+            lines.append(f"SEQUENCE:{sequence}")
+        lines.append(f"DTSTART:{format_utc(lesson.time_start)}")
+        lines.append("STATUS:CONFIRMED")
+        name = self.event_name(lesson)
+        if name:
+            lines.append(f"SUMMARY:{escape_text(name)}")
+        lines.append(f"UID:{lesson.pair_id}")
+        if lesson.zoom_url:
+            lines.append(f"URL:{escape_text(lesson.zoom_url)}")
+        lines.append("END:VEVENT")
+        return "\r\n".join([fold_line(line) for line in lines])
+
+    def serialize(self) -> str:
+        logging.debug("Serializing %d events", len(self._events))
+        return "".join(
+            [
+                ICS_CALENDAR_HEADER,
+                *[f"{event}\r\n" for event in self._events],
+                ICS_CALENDAR_FOOTER,
+            ],
+        )
+
+    def stream(self, lessons_by_day: Iterable[list[LessonRecord]]) -> Iterator[str]:
+        yield ICS_CALENDAR_HEADER
+        for lessons in lessons_by_day:
+            yield "".join([f"{self.render_event(lesson)}\r\n" for lesson in lessons])
+        yield ICS_CALENDAR_FOOTER
+
+
+class EventState(NamedTuple):
+    content_hash: str
+    sequence: int
+    last_modified: str
+
+    def advance(self, content_hash: str, now: str) -> "EventState":
+        if content_hash == self.content_hash:
+            return self
+        return EventState(content_hash, self.sequence + 1, now)
+
+
+class RenderedEvent(NamedTuple):
+    state: EventState
+    text: str
+
+
+def event_uid(lesson: LessonRecord) -> str:
+    return lesson.pair_id.__str__()
+
+
+def event_hash(lesson: LessonRecord) -> str:
+    return hashlib.blake2b(repr(lesson).encode(), digest_size=16).hexdigest()
+
+
+def advance_event_states(
+    previous: dict[str, EventState],
+    hashes: dict[str, str],
+    now: str,
+) -> dict[str, EventState]:
+    return {
+        uid: previous[uid].advance(content_hash, now)
+        if uid in previous
+        else EventState(content_hash, 0, now)
+        for uid, content_hash in hashes.items()
+    }
+
+
+class IncrementalCalendar(FastCalendar):
+    def __init__(
+        self,
+        language: Languages,
+        states: dict[str, EventState],
+        previous: dict[str, RenderedEvent] | None = None,
+    ) -> None:
+        super().__init__(language)
+        self._states = states
+        self._previous = previous if previous is not None else {}
+        self.rendered: dict[str, RenderedEvent] = {}
+        self.changed: int = 0
+
+    def add_event(self, lesson: LessonRecord) -> None:
+        uid = event_uid(lesson)
+        state = self._states[uid]
+        event = self._previous.get(uid)
+        if event is None or event.state != state:
+            event = RenderedEvent(
+                state=state,
+                text=self.render_event(
+                    lesson,
+                    sequence=state.sequence,
+                    last_modified=state.last_modified,
+                ),
+            )
+            self.changed += 1
+        self.rendered[uid] = event
+        self._events.append(event.text)
+
+    def stream_reconciled(
+        self,
+        lessons_by_day: Iterable[list[LessonRecord]],
+        reconcile: Callable[[list[LessonRecord]], dict[str, EventState]],
+    ) -> Iterator[str]:
+        yield ICS_CALENDAR_HEADER
+        for lessons in lessons_by_day:
+            self._states = reconcile(lessons)
+            for lesson in lessons:
+                self.add_event(lesson)
+            yield "".join([f"{event}\r\n" for event in self._events])
+            self._events.clear()
+        yield ICS_CALENDAR_FOOTER
+
+
+def escape_text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def format_utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold_line(line: str) -> str:
+    if len(line) * 4 <= ICS_LINE_LIMIT_OCTETS:
+        return line
+    encoded = line.encode()
+    if len(encoded) <= ICS_LINE_LIMIT_OCTETS:
+        return line
+    parts: list[str] = []
+    start, limit = 0, ICS_LINE_LIMIT_OCTETS
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(encoded[start:end].decode())
+        start, limit = end, ICS_LINE_LIMIT_OCTETS - 1
+    return "\r\n ".join(parts)
+
+
+TITLE_CASE_EXCEPTIONS: frozenset[str] = frozenset(
+    {
         "of",
         "the",
         "and",
@@ -144,11 +359,16 @@ def camelcase_title(title: str, language: Languages = Languages.ENGLISH) -> str:
         "ID",
         "URL",
         "Zoom",
-    }
+    },
+)
+
+
+@lru_cache(maxsize=4096)
+def camelcase_title(title: str, language: Languages = Languages.ENGLISH) -> str:
     if language is Languages.ENGLISH:
         return " ".join(
             [
-                word.title() if word not in EXCEPTIONS else word
+                word.title() if word not in TITLE_CASE_EXCEPTIONS else word
                 for word in title.split()
             ],
         )
@@ -157,16 +377,69 @@ def camelcase_title(title: str, language: Languages = Languages.ENGLISH) -> str:
         for i, word in enumerate(title.split()):
             if i == 0:
                 resulting_words.append(
-                    word.capitalize() if word not in EXCEPTIONS else word,
+                    word.capitalize() if word not in TITLE_CASE_EXCEPTIONS else word,
                 )
             else:
-                resulting_words.append(word.lower() if word not in EXCEPTIONS else word)
+                resulting_words.append(
+                    word.lower() if word not in TITLE_CASE_EXCEPTIONS else word,
+                )
         return " ".join(resulting_words)
 
 
-def create_calendar(language: Languages, lessons: list[Lesson]) -> Calendar:
-    logging.debug("Creating calendar...")
-    calendar = Calendar(language)
+class RenderContext(NamedTuple):
+    language: Languages
+    note_labels: dict[NotesOfNotes, str]
+    location_prefix: str
+    building_names: dict[Buildings, str]
+    type_suffixes: dict[LessonTypes, str]
+
+    @classmethod
+    def build(cls, language: Languages) -> "RenderContext":
+        return cls(
+            language=language,
+            note_labels={
+                note_type: f"{camelcase_title(label, language)}: "
+                for note_type, label in NOTES_TR[language].items()
+            },
+            location_prefix=f"{AUDITORIUMS_TR[language][0][1].title()} ",
+            building_names={
+                building: names[0] for building, names in BUILDINGS_TR[language].items()
+            },
+            type_suffixes={
+                lesson_type: f" ({names[1]})"
+                for lesson_type, names in LESSON_TYPES_TR[language].items()
+            },
+        )
+
+
+RENDER_CONTEXTS: dict[Languages, RenderContext] = {
+    language: RenderContext.build(language) for language in Languages
+}
+
+
+@lru_cache(maxsize=4096)
+def event_title(
+    language: Languages,
+    subject: str | None,
+    work_type: LessonTypes,
+) -> str:
+    name = f"{subject}{RENDER_CONTEXTS[language].type_suffixes[work_type]}"
+    if language is Languages.ENGLISH:
+        return camelcase_title(name)
+    return name
+
+
+def create_calendar(
+    language: Languages,
+    lessons: list[LessonRecord],
+    serializer: CalendarSerializers = ICS_SERIALIZER,
+) -> Calendar:
+    logging.debug("Creating calendar with %s serializer...", serializer)
+    calendar = (
+        FastCalendar(language)
+        if serializer is CalendarSerializers.FAST
+        else Calendar(language)
+    )
     for lesson in lessons:
         calendar.add_event(lesson)
     return calendar
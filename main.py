@@ -1,18 +1,66 @@
+import asyncio
 import logging
 import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Query
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+    multiprocess,
+)
+from pydantic import ValidationError
 from starlette import status
-from starlette.responses import Response
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
 
+from admission.control import (
+    AdmissionController,
+    AdmissionRejectedError,
+    RateLimiter,
+    RateLimitExceededError,
+)
+from authenticate.breaker import CircuitOpenError
+from authenticate.http import close_shared_async_client, export_connection_stats
+from authenticate.registry import get_registry
+from caching.compression import negotiate_encoding
+from caching.prefetch import PREFETCH_ENABLED, Prefetcher
+from caching.responses import (
+    CachedCalendar,
+    DiskResponseCache,
+    ResponseCache,
+    create_response_cache,
+)
+from caching.singleflight import AsyncSingleFlight
 from custom_i18n.schd import Languages
-from generate_calendar import main as generate_calendar
+from generate_calendar import amain as generate_calendar
+from generate_calendar import astream as stream_calendar
+from generate_calendar import format_date, should_stream
+from metrics.pipeline import STALE_RESPONSES, record_cache
+from schedule.index import LessonFilter
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    if PREFETCH_ENABLED:
+        PREFETCHER.start()
+    yield
+    await PREFETCHER.stop()
+    for task in list(REVALIDATION_TASKS):
+        task.cancel()
+    await asyncio.gather(*REVALIDATION_TASKS, return_exceptions=True)
+    await close_shared_async_client()
+
 
 app = FastAPI(
     title="ITMO Schedule API",
     version="1.0",
     description="API for converting ITMO schedule to iCalendar format",
+    lifespan=lifespan,
 )
 
 logging.basicConfig(
@@ -25,37 +73,288 @@ logging.basicConfig(
 
 
 def check_env():
-    if not os.getenv("API_KEY"):
-        msg = "API_KEY is not set"
+    if not get_registry().has_api_keys():
+        msg = "API_KEY is not set and no accounts are configured"
         raise ValueError(msg)
 
 
 check_env()
 
+RESPONSE_CACHES: dict[str, ResponseCache | DiskResponseCache] = {}
+ADMISSION = AdmissionController()
+RATE_LIMITER = RateLimiter()
+
+
+def get_response_cache(account: str) -> ResponseCache | DiskResponseCache:
+    if account not in RESPONSE_CACHES:
+        RESPONSE_CACHES[account] = create_response_cache(account)
+    return RESPONSE_CACHES[account]
+
+
+def metrics_registry() -> CollectorRegistry | None:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return None
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+async def refresh_calendar(
+    account: str,
+    start_date: str,
+    end_date: str,
+    language: Languages,
+    lesson_filter: LessonFilter | None = None,
+) -> None:
+    async with ADMISSION.admit(queue=False):
+        calendar = await generate_calendar(
+            start_date,
+            end_date,
+            language=language,
+            account=account,
+            lesson_filter=lesson_filter,
+        )
+        await asyncio.to_thread(
+            get_response_cache(account).put,
+            (
+                start_date,
+                end_date,
+                language,
+                lesson_filter.cache_key() if lesson_filter is not None else "",
+            ),
+            calendar,
+        )
+
+
+async def build_calendar(
+    account: str,
+    start_date: str,
+    end_date: str,
+    language: Languages,
+    lesson_filter: LessonFilter,
+) -> CachedCalendar:
+    async with ADMISSION.admit():
+        calendar = await generate_calendar(
+            start_date,
+            end_date,
+            language=language,
+            account=account,
+            lesson_filter=lesson_filter,
+        )
+        return await asyncio.to_thread(
+            get_response_cache(account).put,
+            (start_date, end_date, language, lesson_filter.cache_key()),
+            calendar,
+        )
+
+
+PREFETCHER = Prefetcher(refresh_calendar, get_registry().served_names)
+CALENDAR_BUILDS: AsyncSingleFlight[CachedCalendar] = AsyncSingleFlight()
+REVALIDATIONS: AsyncSingleFlight[None] = AsyncSingleFlight()
+REVALIDATION_TASKS: set[asyncio.Task] = set()
+
+
+async def revalidate_calendar(
+    account: str,
+    start_date: str,
+    end_date: str,
+    language: Languages,
+    lesson_filter: LessonFilter,
+) -> None:
+    try:
+        await REVALIDATIONS.do(
+            (account, start_date, end_date, language, lesson_filter.cache_key()),
+            lambda: refresh_calendar(
+                account,
+                start_date,
+                end_date,
+                language,
+                lesson_filter,
+            ),
+        )
+    except Exception as e:
+        logging.warning(
+            "Failed to revalidate %s %s - %s (%s): %s",
+            account,
+            start_date,
+            end_date,
+            language,
+            e,
+        )
+
+
+def schedule_revalidation(
+    account: str,
+    start_date: str,
+    end_date: str,
+    language: Languages,
+    lesson_filter: LessonFilter,
+) -> None:
+    task = asyncio.create_task(
+        revalidate_calendar(account, start_date, end_date, language, lesson_filter),
+    )
+    REVALIDATION_TASKS.add(task)
+    task.add_done_callback(REVALIDATION_TASKS.discard)
+
+
+def error_response(error: Exception) -> Response:
+    if isinstance(error, CircuitOpenError | AdmissionRejectedError):
+        return JSONResponse(
+            content={"result": None, "error": error.__str__()},
+            headers={"Retry-After": f"{int(error.retry_after) + 1}"},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS
+            if isinstance(error, RateLimitExceededError)
+            else status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    return JSONResponse(
+        content={"result": None, "error": error.__str__()},
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    )
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            ADMISSION.release()
+
+
+def calendar_response(
+    cached: CachedCalendar,
+    max_age: float,
+    encoding: str | None,
+    if_none_match: str | None,
+    if_modified_since: str | None,
+) -> Response:
+    if encoding not in cached.variants:
+        encoding = None
+    headers = cached.headers(max_age, encoding)
+    if cached.not_modified(if_none_match, if_modified_since):
+        return Response(
+            content=None,
+            headers=headers,
+            status_code=status.HTTP_304_NOT_MODIFIED,
+        )
+    return Response(
+        content=cached.body(encoding),
+        media_type="text/calendar",
+        headers=headers,
+        status_code=status.HTTP_200_OK,
+    )
+
 
 @app.get("/")
-def get_root() -> Response:
+async def get_root() -> Response:
     return Response(content=None, status_code=status.HTTP_200_OK)
 
 
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    export_connection_stats()
+    return Response(
+        content=generate_latest(metrics_registry() or REGISTRY),
+        headers={"Content-Type": CONTENT_TYPE_LATEST},
+        status_code=status.HTTP_200_OK,
+    )
+
+
 @app.get("/{api_key}/{start_date}/{end_date}/{language}/schedule.ics")
-def get_calendar(
+async def get_calendar(
     api_key: str,
     start_date: str | datetime,
     end_date: str | datetime,
     language: Languages,
+    if_none_match: str | None = Header(default=None),
+    if_modified_since: str | None = Header(default=None),
+    accept_encoding: str | None = Header(default=None),
+    lesson_type: list[str] = Query(default=[], alias="type"),
+    subject_id: list[int] = Query(default=[]),
+    group: list[str] = Query(default=[]),
+    building: list[int] = Query(default=[]),
+    lesson_format: list[int] = Query(default=[], alias="format"),
 ) -> Response:
-    if api_key != os.getenv("API_KEY"):
+    account = get_registry().account_for_key(api_key)
+    if account is None:
         return Response(content=None, status_code=status.HTTP_401_UNAUTHORIZED)
     try:
-        calendar = generate_calendar(start_date, end_date, language=language)
-    except Exception as e:
-        return Response(
-            content={"result": None, "error": e.__str__()},
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        RATE_LIMITER.check(api_key)
+    except RateLimitExceededError as e:
+        return error_response(e)
+    try:
+        lesson_filter = LessonFilter(
+            work_type_id=lesson_type,
+            subject_id=subject_id,
+            group=group,
+            bld_id=building,
+            format_id=lesson_format,
         )
-    return Response(
-        content=calendar,
-        media_type="text/calendar",
-        status_code=status.HTTP_200_OK,
+    except ValidationError as e:
+        return JSONResponse(
+            content={"detail": e.errors(include_url=False)},
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response_cache = get_response_cache(account.name)
+    start, end = format_date(start_date), format_date(end_date)
+    cache_key = (start, end, language, lesson_filter.cache_key())
+    if PREFETCH_ENABLED and lesson_filter.is_empty():
+        PREFETCHER.record((account.name, start, end, language))
+    encoding = negotiate_encoding(accept_encoding)
+    cached = response_cache.get(cache_key, encoding)
+    record_cache("response", hit=cached is not None)
+    if cached is not None:
+        return calendar_response(
+            cached,
+            response_cache.ttl,
+            encoding,
+            if_none_match,
+            if_modified_since,
+        )
+    stale = response_cache.get_stale(cache_key, encoding)
+    if stale is not None:
+        STALE_RESPONSES.inc()
+        schedule_revalidation(account.name, start, end, language, lesson_filter)
+        return calendar_response(
+            stale,
+            0,
+            encoding,
+            if_none_match,
+            if_modified_since,
+        )
+    if lesson_filter.is_empty() and should_stream(start_date, end_date):
+        try:
+            await ADMISSION.acquire()
+        except AdmissionRejectedError as e:
+            return error_response(e)
+        try:
+            chunks = await stream_calendar(
+                start_date,
+                end_date,
+                language=language,
+                account=account.name,
+            )
+        except Exception as e:
+            ADMISSION.release()
+            return error_response(e)
+        except BaseException:
+            ADMISSION.release()
+            raise
+        return AdmittedStreamingResponse(
+            content=chunks,
+            media_type="text/calendar",
+            status_code=status.HTTP_200_OK,
+        )
+    try:
+        cached = await CALENDAR_BUILDS.do(
+            (account.name, *cache_key),
+            lambda: build_calendar(account.name, start, end, language, lesson_filter),
+        )
+    except Exception as e:
+        return error_response(e)
+    return calendar_response(
+        cached,
+        response_cache.ttl,
+        encoding,
+        if_none_match,
+        if_modified_since,
     )
@@ -0,0 +1,120 @@
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+
+from prometheus_client import Counter, Gauge, Histogram
+
+PIPELINE_STAGE_BUCKETS: tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+RANGE_LENGTH_BUCKETS: tuple[tuple[int, str], ...] = (
+    (1, "day"),
+    (7, "week"),
+    (31, "month"),
+    (190, "term"),
+)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "isu2cal_pipeline_stage_seconds",
+    "Time spent in each calendar pipeline stage",
+    ["stage", "language", "range"],
+    buckets=PIPELINE_STAGE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "isu2cal_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+STALE_RESPONSES = Counter(
+    "isu2cal_stale_responses_total",
+    "Calendars served past their freshness lifetime while revalidating",
+)
+UPSTREAM_BREAKER_STATE = Gauge(
+    "isu2cal_upstream_breaker_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["upstream"],
+    multiprocess_mode="max",
+)
+UPSTREAM_BREAKER_TRIPS = Counter(
+    "isu2cal_upstream_breaker_trips_total",
+    "Times the upstream circuit breaker opened",
+    ["upstream"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "isu2cal_upstream_requests_total",
+    "HTTP requests sent upstream by connection pool",
+    ["pool"],
+)
+UPSTREAM_CONNECTIONS = Counter(
+    "isu2cal_upstream_connections_total",
+    "Upstream connections opened by connection pool",
+    ["pool"],
+)
+UPSTREAM_REUSED_CONNECTIONS = Counter(
+    "isu2cal_upstream_reused_connections_total",
+    "Upstream requests sent over an already open connection",
+    ["pool"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "isu2cal_admission_in_flight",
+    "Calendar pipeline executions currently admitted",
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "isu2cal_admission_queued",
+    "Calendar requests waiting for a pipeline slot",
+    multiprocess_mode="livesum",
+)
+ADMISSION_REJECTIONS = Counter(
+    "isu2cal_admission_rejections_total",
+    "Calendar requests shed by admission control",
+    ["reason"],
+)
+
+_PIPELINE_LABELS: ContextVar[tuple[str, str]] = ContextVar(
+    "pipeline_labels",
+    default=("", ""),
+)
+
+
+def range_label(start_date: date, end_date: date) -> str:
+    days = (end_date - start_date).days + 1
+    for limit, label in RANGE_LENGTH_BUCKETS:
+        if days <= limit:
+            return label
+    return "longer"
+
+
+def set_pipeline_labels(language: str, start_date: date, end_date: date) -> None:
+    _PIPELINE_LABELS.set((language, range_label(start_date, end_date)))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PIPELINE_STAGE_SECONDS.labels(name, *_PIPELINE_LABELS.get()).observe(
+            time.perf_counter() - started,
+        )
+
+
+def record_cache(cache: str, hit: bool, amount: int = 1) -> None:
+    if amount:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(amount)
@@ -0,0 +1,91 @@
+import time
+from collections.abc import Hashable, Iterator
+
+from pydantic import BaseModel, field_validator
+
+from schedule.models import Buildings, LessonFormats, LessonRecord, LessonTypes
+
+
+class LessonFilter(BaseModel):
+    work_type_id: frozenset[LessonTypes] = frozenset()
+    subject_id: frozenset[int] = frozenset()
+    group: frozenset[str] = frozenset()
+    bld_id: frozenset[Buildings] = frozenset()
+    format_id: frozenset[LessonFormats] = frozenset()
+
+    @field_validator("work_type_id", "bld_id", "format_id", mode="before")
+    @classmethod
+    def parse_numeric_ids(cls, values: list) -> list:
+        return [
+            int(value) if isinstance(value, str) and value.isdigit() else value
+            for value in values
+        ]
+
+    def criteria(self) -> Iterator[tuple[str, frozenset[Hashable]]]:
+        for field in self.model_fields:
+            values = getattr(self, field)
+            if values:
+                yield field, values
+
+    def is_empty(self) -> bool:
+        return next(self.criteria(), None) is None
+
+    def cache_key(self) -> str:
+        return "&".join(
+            f"{field}={','.join(sorted(filter_value(value) for value in values))}"
+            for field, values in self.criteria()
+        )
+
+
+def filter_value(value: Hashable) -> str:
+    if isinstance(value, LessonTypes | Buildings | LessonFormats):
+        return f"{value.values[0]}"
+    return f"{value}".strip()
+
+
+def index_value(lesson: LessonRecord, field: str) -> Hashable:
+    value = getattr(lesson, field)
+    return value.strip() if isinstance(value, str) else value
+
+
+class LessonIndex:
+    def __init__(self, lessons: list[LessonRecord], source: str = "") -> None:
+        self.lessons = lessons
+        self.source = source
+        self.built_at = time.monotonic()
+        self.rendered: dict[str, str] = {}
+        self._positions: dict[str, dict[Hashable, list[int]]] = {
+            field: {} for field in LessonFilter.model_fields
+        }
+        for position, lesson in enumerate(lessons):
+            for field, positions in self._positions.items():
+                positions.setdefault(index_value(lesson, field), []).append(position)
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.monotonic() - self.built_at < ttl
+
+    def touch(self) -> None:
+        self.built_at = time.monotonic()
+
+    def remember(self, filter_key: str, content: str, max_entries: int) -> None:
+        self.rendered[filter_key] = content
+        while len(self.rendered) > max_entries:
+            del self.rendered[next(iter(self.rendered))]
+
+    def select(self, lesson_filter: LessonFilter) -> list[LessonRecord]:
+        selected: set[int] | None = None
+        for field, values in lesson_filter.criteria():
+            matches: set[int] = set()
+            for value in values:
+                matches.update(
+                    self._positions[field].get(
+                        value.strip() if isinstance(value, str) else value,
+                        (),
+                    ),
+                )
+            selected = matches if selected is None else selected & matches
+            if not selected:
+                return []
+        if selected is None:
+            return self.lessons
+        return [self.lessons[position] for position in sorted(selected)]
@@ -1,7 +1,9 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import NamedTuple
 
 from aenum import MultiValueEnum
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 
 class LessonFormats(MultiValueEnum):
@@ -66,6 +68,45 @@ class Lesson(BaseModel):
         )
         super().__init__(**data)
 
+    def to_record(self) -> "LessonRecord":
+        return LessonRecord(
+            pair_id=self.pair_id,
+            subject=self.subject,
+            subject_id=self.subject_id,
+            note=self.note,
+            time_start=self.time_start,
+            time_end=self.time_end,
+            teacher_name=self.teacher_name,
+            teacher_id=self.teacher_id,
+            room=self.room,
+            bld_id=self.bld_id,
+            format_id=self.format_id,
+            work_type_id=self.work_type_id,
+            group=self.group,
+            flow_id=self.flow_id,
+            zoom_url=self.zoom_url,
+            zoom_password=self.zoom_password,
+        )
+
+
+class LessonRecord(NamedTuple):
+    pair_id: int | str
+    subject: str | None
+    subject_id: int
+    note: str | None
+    time_start: datetime
+    time_end: datetime
+    teacher_name: str | None
+    teacher_id: int | None
+    room: str | None
+    bld_id: Buildings | None
+    format_id: LessonFormats
+    work_type_id: LessonTypes
+    group: str
+    flow_id: int
+    zoom_url: str | None
+    zoom_password: str | None
+
 
 class Day(BaseModel):
     day_number: int
@@ -81,3 +122,109 @@ class Schedule(BaseModel):
     code: int
     data: list[Day]
     message: str | None
+
+
+SCHEDULE_TIMEZONE: timezone = timezone(timedelta(hours=3))
+
+
+def enum_lookup(enum: type[MultiValueEnum]) -> dict:
+    return {value: member for member in enum for value in member.values}
+
+
+LESSON_FORMATS_BY_VALUE: dict[str | int, LessonFormats] = enum_lookup(LessonFormats)
+LESSON_TYPES_BY_VALUE: dict[str | int, LessonTypes] = enum_lookup(LessonTypes)
+BUILDINGS_BY_VALUE: dict[str | int | None, Buildings] = enum_lookup(Buildings)
+
+
+@lru_cache(maxsize=2048)
+def parse_time_of_day(value: str) -> timedelta:
+    hours, minutes = value.split(":")
+    return timedelta(hours=int(hours), minutes=int(minutes))
+
+
+@lru_cache(maxsize=4096)
+def parse_day_base(value: str) -> datetime:
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=SCHEDULE_TIMEZONE)
+
+
+def resolve_enum(lookup: dict, value: str | int | None, field: str):
+    try:
+        return lookup[value]
+    except KeyError:
+        msg = f"Unknown {field} value: {value!r}"
+        raise ValueError(msg) from None
+
+
+class RawLesson(BaseModel):
+    pair_id: int | str
+    subject: str | None
+    subject_id: int
+    note: str | None
+    time_start: str
+    time_end: str
+    teacher_name: str | None
+    teacher_id: int | None
+    room: str | None
+    building: str | None
+    bld_id: int | None
+    main_bld_id: int | None
+    format: str | int
+    format_id: int
+    type: str | int | None
+    work_type: str | int
+    work_type_id: int
+    group: str
+    flow_type_id: int
+    flow_id: int
+    zoom_url: str | None
+    zoom_password: str | None
+    zoom_info: str | None
+
+    def to_record(self, base: datetime) -> LessonRecord:
+        return LessonRecord(
+            pair_id=self.pair_id,
+            subject=self.subject,
+            subject_id=self.subject_id,
+            note=self.note,
+            time_start=base + parse_time_of_day(self.time_start),
+            time_end=base + parse_time_of_day(self.time_end),
+            teacher_name=self.teacher_name,
+            teacher_id=self.teacher_id,
+            room=self.room,
+            bld_id=None
+            if self.bld_id is None
+            else resolve_enum(BUILDINGS_BY_VALUE, self.bld_id, "bld_id"),
+            format_id=resolve_enum(LESSON_FORMATS_BY_VALUE, self.format_id, "format_id"),
+            work_type_id=resolve_enum(
+                LESSON_TYPES_BY_VALUE,
+                self.work_type_id,
+                "work_type_id",
+            ),
+            group=self.group,
+            flow_id=self.flow_id,
+            zoom_url=self.zoom_url,
+            zoom_password=self.zoom_password,
+        )
+
+
+class RawDay(BaseModel):
+    day_number: int
+    week_number: int
+    date: str
+    note: str | None
+    type: str | None
+    lessons: list[RawLesson]
+    intersections: list[list[int]] | None
+
+    def to_records(self) -> list[LessonRecord]:
+        base = parse_day_base(self.date)
+        return [lesson.to_record(base) for lesson in self.lessons]
+
+
+class RawSchedule(BaseModel):
+    code: int
+    data: list[RawDay]
+    message: str | None
+
+
+RAW_DAYS_ADAPTER: TypeAdapter[list[RawDay]] = TypeAdapter(list[RawDay])
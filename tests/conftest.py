@@ -0,0 +1,81 @@
+import asyncio
+import os
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+
+import httpx
+import pytest
+
+os.environ.setdefault("API_KEY", "test-api-key")
+os.environ.setdefault("DAY_STORE_PATH", "")
+
+import generate_calendar  # noqa: E402
+from benchmarks.fixtures import generate_schedule_bytes  # noqa: E402
+from caching.day_store import DayStore  # noqa: E402
+
+SCHEDULE_START_DATE: str = "2023-09-04"
+SCHEDULE_END_DATE: str = "2023-11-03"
+
+
+class FakeAuthenticator:
+    def __init__(self, content: bytes, etag: str | None, latency: float = 0.0) -> None:
+        self.content = content
+        self.etag = etag
+        self.latency = latency
+        self.statuses: list[int] = []
+
+    async def atoken_exists_and_is_valid(self) -> bool:
+        return True
+
+    async def arequest(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        **kwargs,
+    ) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        request = httpx.Request(method, url)
+        if self.etag is not None and (headers or {}).get("If-None-Match") == self.etag:
+            response = httpx.Response(304, request=request)
+        else:
+            response = httpx.Response(
+                200,
+                content=self.content,
+                headers={"ETag": self.etag} if self.etag is not None else {},
+                request=request,
+            )
+        self.statuses.append(response.status_code)
+        return response
+
+
+@pytest.fixture
+def authenticator(
+    request: pytest.FixtureRequest,
+    monkeypatch: pytest.MonkeyPatch,
+) -> FakeAuthenticator:
+    start = date.fromisoformat(SCHEDULE_START_DATE)
+    end = date.fromisoformat(SCHEDULE_END_DATE)
+    fake = FakeAuthenticator(
+        generate_schedule_bytes(start, (end - start).days + 1, 4),
+        getattr(request, "param", '"v1"'),
+    )
+    monkeypatch.setattr(generate_calendar, "get_authenticator", lambda account: fake)
+    monkeypatch.setattr(generate_calendar, "get_day_store", lambda: None)
+    monkeypatch.setattr(generate_calendar, "_UPSTREAM_SNAPSHOTS", OrderedDict())
+    monkeypatch.setattr(generate_calendar, "_LESSON_INDEXES", OrderedDict())
+    monkeypatch.setattr(generate_calendar, "_RENDERED_EVENTS", OrderedDict())
+    return fake
+
+
+@pytest.fixture
+def day_store(
+    authenticator: FakeAuthenticator,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> DayStore:
+    store = DayStore(tmp_path / "schedule-days.sqlite3")
+    monkeypatch.setattr(generate_calendar, "get_day_store", lambda: store)
+    return store
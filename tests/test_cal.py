@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+from benchmarks.fixtures import generate_schedule_bytes
+from custom_i18n.langs import Languages
+from generate_calendar import parse_schedule
+from ics_calendar.cal import ICS_LINE_LIMIT_OCTETS, CalendarSerializers, create_calendar
+from schedule.models import LessonRecord
+
+GOLDEN_START_DATE: date = date(2023, 9, 4)
+
+
+@pytest.fixture(scope="module")
+def lessons() -> list[LessonRecord]:
+    return parse_schedule(generate_schedule_bytes(GOLDEN_START_DATE, 28, 5))
+
+
+def events_by_uid(content: str) -> dict[str, list[str]]:
+    lines = [
+        line
+        for line in content.replace("\r\n ", "").split("\r\n")
+        if line and not line.startswith("LAST-MODIFIED:")
+    ]
+    assert lines[:3] == ["BEGIN:VCALENDAR", "VERSION:2.0", lines[2]]
+    assert lines[-1] == "END:VCALENDAR"
+    events: dict[str, list[str]] = {}
+    event: list[str] = []
+    for line in lines[3:-1]:
+        event.append(line)
+        if line == "END:VEVENT":
+            uid = next(item for item in event if item.startswith("UID:"))
+            events[uid] = event
+            event = []
+    assert not event
+    return events
+
+
+@pytest.mark.parametrize("language", list(Languages))
+def test_fast_serializer_matches_ics(
+    lessons: list[LessonRecord],
+    language: Languages,
+) -> None:
+    expected = create_calendar(language, lessons, CalendarSerializers.ICS).serialize()
+    actual = create_calendar(language, lessons, CalendarSerializers.FAST).serialize()
+    assert actual.splitlines()[:3] == expected.splitlines()[:3]
+    assert events_by_uid(actual) == events_by_uid(expected)
+    assert len(events_by_uid(actual)) == len(lessons)
+
+
+@pytest.mark.parametrize("language", list(Languages))
+def test_fast_serializer_folds_long_lines(
+    lessons: list[LessonRecord],
+    language: Languages,
+) -> None:
+    content = create_calendar(language, lessons, CalendarSerializers.FAST).serialize()
+    assert content.endswith("\r\n")
+    for line in content.split("\r\n"):
+        assert len(line.encode()) <= ICS_LINE_LIMIT_OCTETS
@@ -0,0 +1,124 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+import generate_calendar
+from caching.day_store import DayStore
+from custom_i18n.langs import Languages
+from tests.conftest import SCHEDULE_END_DATE, SCHEDULE_START_DATE, FakeAuthenticator
+
+
+def count_events(content: str) -> int:
+    return content.count("BEGIN:VEVENT")
+
+
+def event_blocks(content: str) -> list[str]:
+    return sorted(
+        f"BEGIN:VEVENT{block.split('END:VEVENT')[0]}END:VEVENT"
+        for block in content.split("BEGIN:VEVENT")[1:]
+    )
+
+
+def stream_events(language: Languages) -> int:
+    chunks = asyncio.run(
+        generate_calendar.astream(SCHEDULE_START_DATE, SCHEDULE_END_DATE, language),
+    )
+    return count_events("".join(chunks))
+
+
+def render_events(language: Languages) -> int:
+    content = asyncio.run(
+        generate_calendar.amain(SCHEDULE_START_DATE, SCHEDULE_END_DATE, language),
+    )
+    return count_events(content)
+
+
+@pytest.mark.parametrize(
+    ("authenticator", "statuses"),
+    [('"v1"', [200, 304]), (None, [200, 200])],
+    indirect=["authenticator"],
+)
+def test_stream_twice_with_same_payload(
+    authenticator: FakeAuthenticator,
+    statuses: list[int],
+) -> None:
+    first = stream_events(Languages.ENGLISH)
+    second = stream_events(Languages.ENGLISH)
+    assert first > 0
+    assert second == first
+    assert authenticator.statuses == statuses
+    assert render_events(Languages.ENGLISH) == first
+
+
+@pytest.mark.parametrize("use_day_store", [False, True])
+def test_concurrent_streams_share_one_upstream_fetch(
+    authenticator: FakeAuthenticator,
+    request: pytest.FixtureRequest,
+    use_day_store: bool,
+) -> None:
+    if use_day_store:
+        request.getfixturevalue("day_store")
+    authenticator.latency = 0.2
+
+    async def stream_all() -> list[int]:
+        streams = await asyncio.gather(
+            *(
+                generate_calendar.astream(
+                    SCHEDULE_START_DATE,
+                    SCHEDULE_END_DATE,
+                    Languages.ENGLISH,
+                )
+                for _ in range(5)
+            ),
+        )
+        return [count_events("".join(chunks)) for chunks in streams]
+
+    counts = asyncio.run(stream_all())
+    assert counts[0] > 0
+    assert counts == [counts[0]] * 5
+    assert authenticator.statuses == [200]
+
+
+@pytest.mark.parametrize("use_day_store", [False, True])
+def test_stream_matches_rendered_events(
+    authenticator: FakeAuthenticator,
+    request: pytest.FixtureRequest,
+    use_day_store: bool,
+) -> None:
+    if use_day_store:
+        request.getfixturevalue("day_store")
+    streamed = "".join(
+        asyncio.run(
+            generate_calendar.astream(
+                SCHEDULE_START_DATE,
+                SCHEDULE_END_DATE,
+                Languages.ENGLISH,
+            ),
+        ),
+    )
+    rendered = asyncio.run(
+        generate_calendar.amain(
+            SCHEDULE_START_DATE,
+            SCHEDULE_END_DATE,
+            Languages.ENGLISH,
+        ),
+    )
+    assert "SEQUENCE:0" in streamed
+    assert event_blocks(streamed) == event_blocks(rendered)
+
+
+def test_day_store_snapshots_keep_only_validators(
+    authenticator: FakeAuthenticator,
+    day_store: DayStore,
+    tmp_path: Path,
+) -> None:
+    first = stream_events(Languages.ENGLISH)
+    assert [
+        snapshot.days for snapshot in generate_calendar._UPSTREAM_SNAPSHOTS.values()
+    ] == [()]
+    with sqlite3.connect(tmp_path / "schedule-days.sqlite3") as connection:
+        connection.execute("DELETE FROM days")
+    assert stream_events(Languages.ENGLISH) == first
+    assert authenticator.statuses == [200, 304, 200]
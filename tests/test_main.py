@@ -0,0 +1,41 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import main
+from admission.control import AdmissionController, RateLimiter
+from custom_i18n.langs import Languages
+from tests.conftest import SCHEDULE_END_DATE, SCHEDULE_START_DATE, FakeAuthenticator
+
+
+def test_identical_requests_share_one_admission_slot(
+    authenticator: FakeAuthenticator,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    authenticator.latency = 0.5
+    monkeypatch.setattr(
+        main,
+        "ADMISSION",
+        AdmissionController(max_concurrency=2, max_queue=1, queue_timeout=0.1),
+    )
+    monkeypatch.setattr(main, "RATE_LIMITER", RateLimiter(per_minute=0))
+    monkeypatch.setattr(main, "RESPONSE_CACHES", {})
+    url = (
+        f"/{os.environ['API_KEY']}/{SCHEDULE_START_DATE}/{SCHEDULE_END_DATE}/"
+        f"{Languages.ENGLISH.value}/schedule.ics"
+    )
+
+    async def request_all() -> list[httpx.Response]:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app),
+            base_url="http://test",
+        ) as client:
+            return await asyncio.gather(*(client.get(url) for _ in range(8)))
+
+    responses = asyncio.run(request_all())
+    assert [response.status_code for response in responses] == [200] * 8
+    assert len({response.content for response in responses}) == 1
+    assert authenticator.statuses == [200]
+    assert main.ADMISSION.active == 0
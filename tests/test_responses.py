@@ -0,0 +1,29 @@
+from pathlib import Path
+
+from caching.compression import CALENDAR_COMPRESSION_MIN_BYTES
+from caching.responses import CacheKey, DiskResponseCache
+from custom_i18n.langs import Languages
+
+CACHE_KEY: CacheKey = ("2023-09-04", "2023-09-10", Languages.ENGLISH, "")
+LARGE_CALENDAR: str = "BEGIN:VCALENDAR\r\n" + "X" * CALENDAR_COMPRESSION_MIN_BYTES * 4
+
+
+def test_disk_cache_drops_variants_of_replaced_entry(tmp_path: Path) -> None:
+    cache = DiskResponseCache(tmp_path)
+    cache.put(CACHE_KEY, LARGE_CALENDAR)
+    assert set(cache.get(CACHE_KEY, "br").variants) == {"br"}
+    cache.put(CACHE_KEY, "BEGIN:VCALENDAR\r\nEND:VCALENDAR\r\n")
+    entry = cache.get(CACHE_KEY, "br")
+    assert entry.variants == {}
+    assert [path.suffix for path in tmp_path.iterdir()] == [".json"]
+
+
+def test_disk_cache_pairs_variants_with_their_etag(tmp_path: Path) -> None:
+    cache = DiskResponseCache(tmp_path)
+    first = cache.put(CACHE_KEY, LARGE_CALENDAR)
+    second = cache.put(CACHE_KEY, f"{LARGE_CALENDAR}Y")
+    assert first.etag != second.etag
+    entry = cache.get(CACHE_KEY, "gzip")
+    assert entry.etag == second.etag
+    assert entry.variants["gzip"] == second.variants["gzip"]
+    assert len(list(tmp_path.glob("*.gzip"))) == 1